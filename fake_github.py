@@ -0,0 +1,237 @@
+"""
+Offline stand-in for the parts of the GitHub REST API the bot uses for state.
+
+Serves /repos/{owner}/{repo}/contents/{path} GET/PUT with real SHA semantics
+(ETag / If-None-Match, 409 on a stale SHA, 422 on a missing one, `ref` /
+`branch` selecting the branch) and the Git data endpoints behind
+GitHubStateStore.commit_files (ref, commits, trees).
+Latency and 409/5xx failures can be injected to exercise the retry paths.
+
+Run standalone:  python fake_github.py --port 8765 --latency 0.05
+then point the bot at it with GH_API_URL=http://127.0.0.1:8765
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+from collections import Counter
+
+from aiohttp import web
+
+
+def git_sha(kind, data: bytes):
+    return hashlib.sha1(f"{kind} {len(data)}\0".encode() + data).hexdigest()
+
+
+class FakeGitHub:
+    def __init__(self, latency=0.0, conflict_rate=0.0, error_rate=0.0, branch="main", seed=None):
+        self.latency = latency
+        self.conflict_rate = conflict_rate
+        self.error_rate = error_rate
+        self.branch = branch
+        self.random = random.Random(seed)
+        self.stats = Counter()
+
+        # tree sha -> {path: bytes}; commit sha -> (tree sha, parent sha); branch -> commit sha
+        self.trees = {}
+        self.commits = {}
+        self.refs = {branch: self._commit(self._tree({}), None, "initial commit")}
+
+    # ---------- object store ----------
+    def _tree(self, files):
+        listing = json.dumps({path: git_sha("blob", data) for path, data in sorted(files.items())})
+        sha = git_sha("tree", listing.encode())
+        self.trees[sha] = dict(files)
+        return sha
+
+    def _commit(self, tree_sha, parent, message):
+        sha = git_sha("commit", f"{tree_sha}:{parent}:{message}:{len(self.commits)}".encode())
+        self.commits[sha] = (tree_sha, parent)
+        return sha
+
+    @property
+    def head(self):
+        return self.refs[self.branch]
+
+    @property
+    def files(self):
+        return self.files_on(self.branch)
+
+    def files_on(self, branch):
+        return self.trees[self.commits[self.refs[branch]][0]]
+
+    def create_branch(self, name, source=None):
+        self.refs[name] = self.refs[source or self.branch]
+
+    def _write(self, path, data, message, branch=None):
+        branch = branch or self.branch
+        files = dict(self.files_on(branch))
+        files[path] = data
+        self.refs[branch] = self._commit(self._tree(files), self.refs[branch], message)
+
+    def simulate_foreign_write(self, path, data=None, branch=None):
+        """Another writer re-committed `path` (with `data`, if given), so every SHA we handed out is stale."""
+        files = self.files_on(branch or self.branch)
+        if data is not None or path in files:
+            self._write(path, data if data is not None else files[path] + b"\n", "foreign write", branch)
+
+    # ---------- request plumbing ----------
+    @web.middleware
+    async def middleware(self, request, handler):
+        route = request.match_info.route.resource
+        self.stats[f"{request.method} {route.canonical if route else request.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self.random.random() < self.error_rate:
+            self.stats["injected 5xx"] += 1
+            return web.json_response({"message": "Server Error"}, status=502)
+        return await handler(request)
+
+    def _maybe_conflict(self, path=None):
+        if self.conflict_rate and self.random.random() < self.conflict_rate:
+            self.stats["injected 409"] += 1
+            if path:
+                self.simulate_foreign_write(path)
+            else:
+                self._write(".foreign", str(self.random.random()).encode(), "foreign write")
+            return True
+        return False
+
+    def app(self):
+        app = web.Application(middlewares=[self.middleware])
+        base = "/repos/{owner}/{repo}"
+        app.add_routes([
+            web.get(base, self.get_repo),
+            web.get(base + "/contents/{path:.+}", self.get_contents),
+            web.put(base + "/contents/{path:.+}", self.put_contents),
+            web.get(base + "/git/ref/heads/{branch}", self.get_ref),
+            web.patch(base + "/git/refs/heads/{branch}", self.patch_ref),
+            web.get(base + "/git/commits/{sha}", self.get_commit),
+            web.get(base + "/git/trees/{sha}", self.get_tree),
+            web.post(base + "/git/commits", self.post_commit),
+            web.post(base + "/git/trees", self.post_tree),
+        ])
+        return app
+
+    # ---------- handlers ----------
+    async def get_repo(self, request):
+        return web.json_response({"default_branch": self.branch})
+
+    async def get_contents(self, request):
+        path = request.match_info["path"]
+        branch = request.query.get("ref", self.branch)
+        if branch not in self.refs or path not in self.files_on(branch):
+            return web.json_response({"message": "Not Found"}, status=404)
+
+        data = self.files_on(branch)[path]
+        sha = git_sha("blob", data)
+        etag = f'"{sha}"'
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+
+        return web.json_response(
+            {"path": path, "sha": sha, "encoding": "base64", "content": base64.b64encode(data).decode()},
+            headers={"ETag": etag}
+        )
+
+    async def put_contents(self, request):
+        path = request.match_info["path"]
+        body = await request.json()
+        branch = body.get("branch", self.branch)
+        if branch not in self.refs:
+            return web.json_response({"message": f"Branch {branch} not found"}, status=404)
+
+        if self._maybe_conflict(path):
+            return web.json_response({"message": "is at a different sha"}, status=409)
+
+        current = self.files_on(branch).get(path)
+        if current is not None:
+            if "sha" not in body:
+                return web.json_response({"message": '"sha" wasn\'t supplied.'}, status=422)
+            if body["sha"] != git_sha("blob", current):
+                return web.json_response({"message": "is at a different sha"}, status=409)
+
+        data = base64.b64decode(body["content"])
+        self._write(path, data, body.get("message", ""), branch)
+        return web.json_response(
+            {"content": {"path": path, "sha": git_sha("blob", data)}},
+            status=201 if current is None else 200
+        )
+
+    async def get_ref(self, request):
+        branch = request.match_info["branch"]
+        if branch not in self.refs:
+            return web.json_response({"message": "Not Found"}, status=404)
+        return web.json_response({"object": {"sha": self.refs[branch], "type": "commit"}})
+
+    async def get_commit(self, request):
+        sha = request.match_info["sha"]
+        if sha not in self.commits:
+            return web.json_response({"message": "Not Found"}, status=404)
+        return web.json_response({"sha": sha, "tree": {"sha": self.commits[sha][0]}})
+
+    async def get_tree(self, request):
+        sha = request.match_info["sha"]
+        if sha not in self.trees:
+            return web.json_response({"message": "Not Found"}, status=404)
+        entries = [
+            {"path": path, "mode": "100644", "type": "blob", "sha": git_sha("blob", data)}
+            for path, data in sorted(self.trees[sha].items())
+        ]
+        return web.json_response({"sha": sha, "tree": entries, "truncated": False})
+
+    async def post_tree(self, request):
+        body = await request.json()
+        files = dict(self.trees.get(body.get("base_tree"), {}))
+        for entry in body["tree"]:
+            files[entry["path"]] = entry["content"].encode()
+        return web.json_response({"sha": self._tree(files)}, status=201)
+
+    async def post_commit(self, request):
+        body = await request.json()
+        parent = body["parents"][0] if body["parents"] else None
+        return web.json_response({"sha": self._commit(body["tree"], parent, body["message"])}, status=201)
+
+    async def patch_ref(self, request):
+        body = await request.json()
+
+        branch = request.match_info["branch"]
+        if branch not in self.refs:
+            return web.json_response({"message": "Reference does not exist"}, status=422)
+
+        if self._maybe_conflict():
+            return web.json_response({"message": "Update is not a fast forward"}, status=422)
+
+        if self.commits[body["sha"]][1] != self.refs[branch]:
+            return web.json_response({"message": "Update is not a fast forward"}, status=422)
+
+        self.refs[branch] = body["sha"]
+        return web.json_response({"object": {"sha": self.refs[branch]}})
+
+
+async def start(fake: FakeGitHub, host="127.0.0.1", port=8765):
+    runner = web.AppRunner(fake.app())
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def _serve(args):
+    fake = FakeGitHub(args.latency, args.conflict_rate, args.error_rate)
+    await start(fake, args.host, args.port)
+    print(f"Fake GitHub API on http://{args.host}:{args.port}")
+    while True:
+        await asyncio.sleep(3600)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--conflict-rate", type=float, default=0.0, help="fraction of writes answered 409/422")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered 502")
+    asyncio.run(_serve(parser.parse_args()))
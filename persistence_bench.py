@@ -0,0 +1,133 @@
+"""
+Persistence throughput benchmark, run fully offline against fake_github.py.
+
+Drives the bot's real state paths (todo saves, team points, the watcher
+state load/save, the GitHub contents store and the batched replica commit)
+from concurrent workers and reports ops/sec and p50/p99 latency per path.
+
+    python persistence_bench.py --ops 2000 --concurrency 32 --latency 0.03 --conflict-rate 0.05
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from fake_github import FakeGitHub, start
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+async def measure(name, op, ops, concurrency):
+    latencies = []
+    errors = 0
+    counter = iter(range(ops))  # shared, so workers split the ops between them
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await op(i)
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(
+        f"{name:<28} {len(latencies) / elapsed:>10.1f} ops/s"
+        f"   p50 {percentile(latencies, 0.50) * 1000:>8.2f} ms"
+        f"   p99 {percentile(latencies, 0.99) * 1000:>8.2f} ms"
+        f"   errors {errors}"
+    )
+
+
+async def main(args):
+    fake = FakeGitHub(args.latency, args.conflict_rate, args.error_rate, seed=args.seed)
+    runner = await start(fake, port=args.port)
+
+    # the bot reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix="vcbot-bench-")
+    os.environ.update({
+        "GH_API_URL": f"http://127.0.0.1:{args.port}",
+        "GH_TOKEN": "bench",
+        "GH_REPO_OWNER": "bench",
+        "GH_REPO_NAME": "state",
+        "GH_POINTS_FILE_PATH": "points.json",
+        "GH_CF_FILE_PATH": "codeforces.json",
+        "GH_LC_FILE_PATH": "leetcode.json",
+        "STATE_DB_PATH": os.path.join(workdir, "bench_state.db"),
+    })
+    import vc_bot
+
+    async def todo_save(i):
+        key = f"{i % args.channels}:{i}"
+        vc_bot.todo_data[key] = {"pending": [{"id": "001", "name": f"task {i}"}], "completed": [], "embed_message_id": None}
+        await vc_bot.save_todo_data(key)
+
+    async def team_points(i):
+        pts = await vc_bot.get_team_points()
+        await vc_bot.set_team_points(pts["X"] + 1, pts["Y"])
+
+    async def watcher_state(i):
+        cf_data = await vc_bot.load_cf_data()
+        cf_data["last_contest_id"] = i
+        vc_bot.save_cf_data(cf_data)
+
+    async def contents_save(i):
+        await vc_bot.gh_store.save("bench/points.json", {"X": i, "Y": 0})
+
+    async def contents_load(i):
+        await vc_bot.gh_store.load("bench/points.json")
+
+    async def batched_commit(i):
+        await vc_bot.gh_store.commit_files(
+            {f"bench/shard_{i % 4}.json": {"n": i}, "bench/summary.json": {"last": i}},
+            "bench commit"
+        )
+
+    print(f"ops={args.ops} concurrency={args.concurrency} latency={args.latency}s "
+          f"conflict_rate={args.conflict_rate} error_rate={args.error_rate}\n")
+
+    await measure("save_todo_data", todo_save, args.ops, args.concurrency)
+    await measure("get/set_team_points", team_points, args.ops, args.concurrency)
+    await measure("cf watcher state", watcher_state, args.ops, args.concurrency)
+    await measure("gh_store.save (contents)", contents_save, args.remote_ops, args.concurrency)
+    await measure("gh_store.load (ETag)", contents_load, args.remote_ops, args.concurrency)
+    await measure("gh_store.commit_files", batched_commit, args.remote_ops, args.concurrency)
+
+    # everything the local paths dirtied goes out as one replica commit
+    started = time.perf_counter()
+    await vc_bot.replicator.close()
+    print(f"\nreplica flush: {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    await vc_bot.gh_store.close()
+    await runner.cleanup()
+
+    print("\nfake GitHub requests:")
+    for route, count in sorted(fake.stats.items()):
+        print(f"  {count:>7}  {route}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000, help="operations per local path")
+    parser.add_argument("--remote-ops", type=int, default=200, help="operations per GitHub path")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--channels", type=int, default=20, help="todo channels (replica shards)")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake GitHub latency in seconds")
+    parser.add_argument("--conflict-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
@@ -14,13 +14,24 @@ import aiohttp
 import base64
 import json
 import hashlib
+import copy
+import functools
+import sqlite3
+import random
+import math
+import struct
+import bisect
+import heapq
+from array import array
 import time as time_module
 import pytz
 from typing import Literal
+from collections import namedtuple, OrderedDict, Counter
 
 # ================== CONFIG ==================
 TOKEN = os.getenv("TOKEN")
 
+# Defaults for guilds without their own settings (see /vcconfig)
 MONITORED_VC_IDS = {
     1422274947291676672
 }
@@ -39,118 +50,894 @@ ALLOWED_ROLES = {
 TEAM_X_ROLE = 1440768904204124302
 TEAM_Y_ROLE = 1440769096760168498
 
-# points.json loader/saver
-def load_points():
-    try:
-        with open("points.json", "r") as f:
-            return json.load(f)
-    except:
-        return {"X": 0, "Y": 0}
+# ============ GITHUB STATE STORE =============
+GH_TOKEN = os.getenv("GH_TOKEN")
+GH_OWNER = os.getenv("GH_REPO_OWNER")
+GH_REPO = os.getenv("GH_REPO_NAME")
+GH_BRANCH = os.getenv("GH_BRANCH")  # defaults to the repo's default branch
+GH_API_URL = os.getenv("GH_API_URL", "https://api.github.com")
+
+GH_FILE = os.getenv("GH_POINTS_FILE_PATH")
+GH_TODO_FILE = os.getenv("GH_TODO_FILE_PATH", "todo_lists.json")   # legacy single-file todo state
+GH_TODO_DIR = os.getenv("GH_TODO_DIR_PATH", "todo_lists")           # one <channel_id>.json per channel
+GH_CF_FILE = os.getenv("GH_CF_FILE_PATH")
+GH_LC_FILE = os.getenv("GH_LC_FILE_PATH")
+
+GH_POOL_LIMIT = 10          # max concurrent connections to api.github.com
+GH_DNS_CACHE_SECONDS = 300
+GH_KEEPALIVE_SECONDS = 60
+
+GH_CONFLICT_RETRIES = 4             # merge-and-retry attempts after a stale-SHA PUT
+GH_CONFLICT_BACKOFF_SECONDS = 0.5   # first retry delay, doubled each attempt
+
+_MISSING = object()
+
+
+def merge_json(base, ours, theirs):
+    """
+    Three-way merge of two JSON values that diverged from `base`.
+
+    Dicts are merged key by key (so edits to different todo keys or team
+    totals both survive), lists keep our items plus the ones only they added
+    (minus the ones only they removed), and on a true conflict ours wins.
+    """
+    if ours == theirs:
+        return ours
+    if base == ours:
+        return theirs
+    if base == theirs:
+        return ours
+
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        merged = {}
+        for key in list(ours) + [k for k in theirs if k not in ours]:
+            value = merge_json(base.get(key, _MISSING), ours.get(key, _MISSING), theirs.get(key, _MISSING))
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+
+    if isinstance(ours, list) and isinstance(theirs, list):
+        base = base if isinstance(base, list) else []
+        kept = [item for item in ours if item in theirs or item not in base]
+        added = [item for item in theirs if item not in ours and item not in base]
+        return kept + added
+
+    return ours
+
+
+class GitHubStateStore:
+    """
+    JSON state files kept in a GitHub repo via the contents API.
+
+    One pooled aiohttp session is shared by every load/save so watcher ticks
+    reuse the same TLS connection, and the blob SHA needed for updates is
+    tracked per path instead of in a global per file.
+
+    Reads are conditional: the last ETag is sent as If-None-Match and a 304
+    is answered from the in-process copy, which skips the download and decode
+    and does not count against the API rate limit.
+
+    `commit_files` writes several files as one commit through the Git data
+    API (tree -> commit -> ref update) instead of one contents PUT per file.
+    Before building the tree it compares each file's blob SHA in the base
+    tree with the one we last read or wrote, and three-way merges any file
+    someone else changed in the meantime.
+
+    Every read and write targets `branch` (the repo's default branch if unset).
+    """
+
+    def __init__(self, owner, repo, token, branch=None, api_root=GH_API_URL):
+        self.repo_api = f"{api_root}/repos/{owner}/{repo}"
+        self.api_base = f"{self.repo_api}/contents"
+        self.branch = branch
+        self.headers = {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github+json"
+        }
+        self.shas = {}   # path -> blob SHA last read or written (None: file did not exist)
+        self.etags = {}  # path -> (ETag, decoded document)
+        self.bases = {}  # path -> document as of shas[path], the common ancestor for merges
+        self._session = None
+
+    def _session_for(self):
+        # Created lazily: aiohttp sessions must be built inside the running loop
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=GH_POOL_LIMIT,
+                ttl_dns_cache=GH_DNS_CACHE_SECONDS,
+                keepalive_timeout=GH_KEEPALIVE_SECONDS
+            )
+            self._session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+        return self._session
+
+    def url(self, path):
+        return f"{self.api_base}/{path}"
+
+    @staticmethod
+    def blob_sha(text):
+        """The Git blob SHA of `text`, as GitHub reports it for the committed file."""
+        data = text.encode()
+        return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+    async def resolve_branch(self):
+        if self.branch is None:
+            self.branch = (await self._git_ok("GET", ""))["default_branch"]
+        return self.branch
+
+    async def fetch(self, path):
+        """GET `path`; returns the decoded document, or None if the file does not exist."""
+        cached = self.etags.get(path)
+        headers = {"If-None-Match": cached[0]} if cached else None
+        params = {"ref": await self.resolve_branch()}
+
+        session = self._session_for()
+        async with session.get(self.url(path), headers=headers, params=params) as r:
+            if r.status == 304 and cached:
+                return copy.deepcopy(cached[1])
+
+            text = await r.text()
+
+            if r.status == 200:
+                data = json.loads(text)
+                self.shas[path] = data["sha"]
+                content = base64.b64decode(data["content"]).decode()
+                document = json.loads(content)
+                self.bases[path] = copy.deepcopy(document)
+                if r.headers.get("ETag"):
+                    self.etags[path] = (r.headers["ETag"], copy.deepcopy(document))
+                return document
+
+            if r.status == 404:
+                self.shas[path] = None
+                self.bases.pop(path, None)
+                return None
+
+            raise RuntimeError(f"GitHub GET {path} failed ({r.status})\n{text}")
+
+    async def load(self, path, default=None):
+        """
+        Return the decoded JSON stored at `path`.
+        A missing file is created from `default` (if given) and that is returned.
+        """
+        document = await self.fetch(path)
+        if document is not None:
+            return document
+
+        if default is None:
+            raise RuntimeError(f"GitHub GET {path} failed (404)")
+
+        print(f"[GITHUB] {path} missing → creating new one...")
+        await self.save(path, default, message=f"create {path}")
+        return default
+
+    async def _put(self, path, data_dict, message):
+        encoded = base64.b64encode(json.dumps(data_dict, indent=4).encode()).decode()
+        payload = {"message": message or f"update {path}", "content": encoded, "branch": await self.resolve_branch()}
+        if self.shas.get(path):
+            payload["sha"] = self.shas[path]
+
+        session = self._session_for()
+        async with session.put(self.url(path), json=payload) as r:
+            if r.status not in (200, 201):
+                return r.status, await r.text()
+            resp = await r.json()
+            self.shas[path] = resp["content"]["sha"]
+            self.bases[path] = copy.deepcopy(data_dict)
+            # the next GET must see the new content, its ETag is not known yet
+            self.etags.pop(path, None)
+            return r.status, None
+
+    async def save(self, path, data_dict, message=None):
+        """
+        Write `data_dict` to `path`, creating the file if needed.
+
+        If someone else committed since our last read (409/422 on a stale SHA),
+        the remote copy is refetched and three-way merged with ours, then the
+        PUT is retried with exponential backoff. Returns what was written.
+        """
+        if path not in self.shas:
+            # first write since startup: learn the current blob SHA
+            await self.fetch(path)
+
+        for attempt in range(GH_CONFLICT_RETRIES + 1):
+            status, text = await self._put(path, data_dict, message)
+            if status in (200, 201):
+                return data_dict
+
+            if status not in (409, 422) or attempt == GH_CONFLICT_RETRIES:
+                raise RuntimeError(f"GitHub PUT {path} failed ({status})\n{text}")
+
+            print(f"[GITHUB] {path} changed remotely ({status}), merging and retrying")
+            await asyncio.sleep(GH_CONFLICT_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+            base = self.bases.get(path)
+            theirs = await self.fetch(path)
+            if theirs is not None:
+                data_dict = merge_json(base, data_dict, theirs)
+
+    async def _git(self, method, endpoint, payload=None, ok=(200, 201)):
+        """Call a repo endpoint; returns (status, decoded JSON or error text)."""
+        session = self._session_for()
+        url = f"{self.repo_api}/{endpoint}" if endpoint else self.repo_api
+        async with session.request(method, url, json=payload) as r:
+            if r.status in ok:
+                return r.status, await r.json()
+            return r.status, await r.text()
+
+    async def _git_ok(self, method, endpoint, payload=None):
+        status, body = await self._git(method, endpoint, payload)
+        if status not in (200, 201):
+            raise RuntimeError(f"GitHub {method} {endpoint} failed ({status})\n{body}")
+        return body
+
+    async def _merge_remote_changes(self, files, base_tree):
+        """Three-way merge, into `files`, every file whose blob in `base_tree` is not the one we last saw."""
+        tree = await self._git_ok("GET", f"git/trees/{base_tree}?recursive=1")
+        remote = {entry["path"]: entry["sha"] for entry in tree["tree"] if entry["type"] == "blob"}
+
+        for path in files:
+            if remote.get(path) == self.shas.get(path):
+                continue
+            print(f"[GITHUB] {path} changed remotely, merging before commit")
+            base = self.bases.get(path)
+            theirs = await self.fetch(path)
+            if theirs is not None:
+                files[path] = merge_json(base, files[path], theirs)
+
+    async def commit_files(self, files, message):
+        """
+        Commit `files` ({path: JSON document}) to the branch as a single commit.
+
+        Files changed remotely since we last saw them are merged first. If the
+        branch still moves under us the ref update is not a fast-forward, and
+        the whole round is retried with the same bounded backoff as `save`.
+        Returns what was written (merged documents included).
+        """
+        branch = await self.resolve_branch()
+
+        for attempt in range(GH_CONFLICT_RETRIES + 1):
+            head = (await self._git_ok("GET", f"git/ref/heads/{branch}"))["object"]["sha"]
+            base_tree = (await self._git_ok("GET", f"git/commits/{head}"))["tree"]["sha"]
+            await self._merge_remote_changes(files, base_tree)
+
+            # blobs are created inline by the tree entries' "content"
+            contents = {path: json.dumps(document, indent=4) for path, document in files.items()}
+            tree = await self._git_ok("POST", "git/trees", {
+                "base_tree": base_tree,
+                "tree": [
+                    {"path": path, "mode": "100644", "type": "blob", "content": text}
+                    for path, text in contents.items()
+                ]
+            })
+            commit = await self._git_ok("POST", "git/commits", {
+                "message": message,
+                "tree": tree["sha"],
+                "parents": [head]
+            })
+            status, body = await self._git("PATCH", f"git/refs/heads/{branch}", {"sha": commit["sha"]})
+
+            if status == 200:
+                for path, document in files.items():
+                    self.bases[path] = copy.deepcopy(document)
+                    self.shas[path] = self.blob_sha(contents[path])
+                    # the ETag is not known until the next GET
+                    self.etags.pop(path, None)
+                return files
+
+            if status not in (409, 422) or attempt == GH_CONFLICT_RETRIES:
+                raise RuntimeError(f"GitHub ref update failed ({status})\n{body}")
+
+            print(f"[GITHUB] {branch} moved during commit ({status}), merging and retrying")
+            await asyncio.sleep(GH_CONFLICT_BACKOFF_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+gh_store = GitHubStateStore(GH_OWNER, GH_REPO, GH_TOKEN, branch=GH_BRANCH)
+
+
+class WriteBehind:
+    """
+    Dirty-flag write-behind for an in-memory document.
+
+    `mark_dirty()` returns immediately; the upload runs in the background once
+    no new change has arrived for `window` seconds, but never later than
+    `max_staleness` seconds after the first unsaved change. A burst of edits
+    therefore costs a single upload of the latest state.
+    """
+
+    def __init__(self, name, flush_fn, window, max_staleness):
+        self.name = name
+        self.flush_fn = flush_fn
+        self.window = window
+        self.max_staleness = max_staleness
+        self.dirty = False
+        self.first_dirty_at = None
+        self.last_dirty_at = None
+        self._task = None
+        self._lock = None
+
+    def mark_dirty(self):
+        now = time_module.monotonic()
+        self.dirty = True
+        if self.first_dirty_at is None:
+            self.first_dirty_at = now
+        self.last_dirty_at = now
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self.dirty:
+            due = min(self.last_dirty_at + self.window, self.first_dirty_at + self.max_staleness)
+            delay = due - time_module.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            await self.flush()
+
+    async def flush(self):
+        """Upload now if there are unsaved changes."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            self.first_dirty_at = None
+            try:
+                await self.flush_fn()
+            except Exception as e:
+                print(f"[{self.name}] Write-behind flush failed, will retry: {e}")
+                self.mark_dirty()
+
+    async def close(self):
+        """Flush pending changes and stop the background timer (used on shutdown)."""
+        await self.flush()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+
+# ============ LOCAL STATE BACKEND =============
+STATE_DB_FILE = os.getenv("STATE_DB_PATH", "bot_state.db")
+
+# One table per subsystem; each holds the top-level keys of that subsystem's document
+STATE_TABLES = ("points", "todo", "codeforces", "leetcode", "journal", "last_stand", "activity", "shop", "enforcement", "enforcement_config", "journal_posts")
+
+# Append-only event logs, replayed on top of the matching table's snapshot
+STATE_LOGS = ("last_stand_events",)
+
+REPLICA_FLUSH_WINDOW_SECONDS = 5       # quiet period before a burst of changes is uploaded
+REPLICA_MAX_STALENESS_SECONDS = 30     # upper bound on how long a change may stay un-replicated
+
+
+class SQLiteStateBackend:
+    """
+    Primary state storage: a local SQLite database in WAL mode.
+
+    Each subsystem's document is stored as (key, value-as-JSON) rows in its own
+    table, so a single entry (one user's journal settings, one team's points)
+    is read or written by primary key instead of rewriting the whole document.
+    Listeners are called with the table name after every change.
+
+    Append-only logs hold (seq, record) rows for state that is cheaper to
+    journal than to rewrite; see `append`/`replay`/`truncate`.
+    """
+
+    def __init__(self, path, tables=STATE_TABLES, logs=STATE_LOGS):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.tables = set(tables)
+        self.logs = set(logs)
+        self.listeners = []
+
+        with self.conn:
+            for name in tables:
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+            for name in logs:
+                self.conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {name} (seq INTEGER PRIMARY KEY AUTOINCREMENT, record TEXT NOT NULL)"
+                )
+
+    def _table(self, name):
+        # table names are interpolated into SQL, so only known ones are allowed
+        if name not in self.tables:
+            raise KeyError(f"Unknown state table: {name}")
+        return name
+
+    def _log(self, name):
+        if name not in self.logs:
+            raise KeyError(f"Unknown state log: {name}")
+        return name
+
+    def _changed(self, name, key=None):
+        for listener in self.listeners:
+            listener(name, key)
+
+    def keys(self, name):
+        return [row[0] for row in self.conn.execute(f"SELECT key FROM {self._table(name)}")]
+
+    def count(self, name):
+        return self.conn.execute(f"SELECT COUNT(*) FROM {self._table(name)}").fetchone()[0]
+
+    def load(self, name, default=None):
+        """Whole document for `name`; keys missing from the table come from `default`."""
+        rows = self.conn.execute(f"SELECT key, value FROM {self._table(name)}").fetchall()
+        data = copy.deepcopy(default) if default else {}
+        data.update((key, json.loads(value)) for key, value in rows)
+        return data
+
+    def load_prefix(self, name, prefix):
+        """Rows whose key starts with `prefix`, as a primary-key range scan."""
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        rows = self.conn.execute(
+            f"SELECT key, value FROM {self._table(name)} WHERE key >= ? AND key < ?", (prefix, upper)
+        ).fetchall()
+        return {key: json.loads(value) for key, value in rows}
+
+    def save(self, name, data, notify=True):
+        """Replace the whole document for `name`."""
+        table = self._table(name)
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {table}")
+            self.conn.executemany(
+                f"INSERT INTO {table} (key, value) VALUES (?, ?)",
+                [(str(key), json.dumps(value)) for key, value in data.items()]
+            )
+        if notify:
+            self._changed(name)
+
+    def get(self, name, key, default=None):
+        row = self.conn.execute(
+            f"SELECT value FROM {self._table(name)} WHERE key = ?", (str(key),)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, name, key, value):
+        with self.conn:
+            self.conn.execute(
+                f"INSERT OR REPLACE INTO {self._table(name)} (key, value) VALUES (?, ?)",
+                (str(key), json.dumps(value))
+            )
+        self._changed(name, key)
+
+    def update(self, name, data, notify=True):
+        """Upsert every key of `data`, leaving other rows alone."""
+        table = self._table(name)
+        with self.conn:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {table} (key, value) VALUES (?, ?)",
+                [(str(key), json.dumps(value)) for key, value in data.items()]
+            )
+        if notify:
+            for key in data:
+                self._changed(name, key)
+
+    def delete(self, name, key):
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {self._table(name)} WHERE key = ?", (str(key),))
+        self._changed(name, key)
+
+    def delete_many(self, name, keys, notify=True):
+        keys = [str(key) for key in keys]
+        with self.conn:
+            self.conn.executemany(f"DELETE FROM {self._table(name)} WHERE key = ?", [(key,) for key in keys])
+        if notify:
+            for key in keys:
+                self._changed(name, key)
+
+    def append(self, log, record):
+        """Append one record to `log`; returns its sequence number."""
+        with self.conn:
+            cur = self.conn.execute(
+                f"INSERT INTO {self._log(log)} (record) VALUES (?)", (json.dumps(record),)
+            )
+        return cur.lastrowid
+
+    def replay(self, log, after_seq=0):
+        """(seq, record) pairs newer than `after_seq`, oldest first."""
+        rows = self.conn.execute(
+            f"SELECT seq, record FROM {self._log(log)} WHERE seq > ? ORDER BY seq", (after_seq,)
+        ).fetchall()
+        return [(seq, json.loads(record)) for seq, record in rows]
+
+    def truncate(self, log, upto_seq):
+        """Drop records already folded into a snapshot."""
+        with self.conn:
+            self.conn.execute(f"DELETE FROM {self._log(log)} WHERE seq <= ?", (upto_seq,))
+
+    def import_json_file(self, name, path):
+        """One-time migration of a legacy local JSON file into an empty table."""
+        if self.count(name) or not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[STATE] Could not import {path}: {e}")
+            return
+        self.save(name, data, notify=False)
+        print(f"[STATE] Imported {path} into table {name}")
+
+
+class GitHubReplicator:
+    """
+    Asynchronous GitHub replica of selected state tables.
+
+    Changed tables are exported as snapshots to their existing contents-API
+    paths. Changes are collected in a dirty set and, after a quiet window
+    (WriteBehind), every dirty file is pushed together as a single commit.
+    GitHub is only read to seed tables that are empty locally, e.g. after a
+    fresh deploy. A whole-file table whose seed failed stays unseeded: it is
+    kept out of flushes and readers go through `ensure_seeded`, which retries,
+    so a write built on the empty table can never replace the GitHub file.
+
+    Sharded tables are exported as one file per shard (the part of the row key
+    before ":"), so a change only re-uploads its own shard, and shards are
+    fetched on demand with `fetch_shard` instead of being seeded up front.
+    """
 
-def save_points():
-    with open("points.json", "w") as f:
-        json.dump(team_points, f, indent=4)
+    def __init__(self, backend, store, paths, sharded=None):
+        self.backend = backend
+        self.store = store
+        self.paths = paths  # table -> (GitHub path, commit message)
+        self.sharded = sharded or {}  # table -> (GitHub directory, commit message, legacy single-file path)
+        self.dirty = set()  # (table, shard or None)
+        self.merge_listeners = []  # listener(table, rows, removed_keys) after remote changes were merged in
+        self.seeded = set()  # whole-file tables whose local copy is known to be complete
+        self.seed_attempted = set()
+        self.writer = WriteBehind("REPLICA", self.flush, REPLICA_FLUSH_WINDOW_SECONDS, REPLICA_MAX_STALENESS_SECONDS)
+        backend.listeners.append(self.mark_dirty)
+
+    @staticmethod
+    def shard_of(key):
+        return str(key).split(":", 1)[0]
+
+    def shard_path(self, name, shard):
+        return f"{self.sharded[name][0]}/{shard}.json"
+
+    def mark_dirty(self, name, key=None):
+        if name in self.paths:
+            self.dirty.add((name, None))
+        elif name in self.sharded:
+            if key is not None:
+                self.dirty.add((name, self.shard_of(key)))
+            else:
+                self.dirty.update((name, self.shard_of(k)) for k in self.backend.keys(name))
+        else:
+            return
+        self.writer.mark_dirty()
+
+    def snapshot(self, name, shard=None):
+        """(GitHub path, commit message, document) for one replicated file."""
+        if shard is None:
+            path, message = self.paths[name]
+            return path, message, self.backend.load(name)
+        return self.shard_path(name, shard), self.sharded[name][1], self.backend.load_prefix(name, f"{shard}:")
+
+    async def flush(self):
+        targets, self.dirty = self.dirty, set()
+        # never export a table that may be missing what GitHub holds
+        unseeded = {(name, shard) for name, shard in targets if name in self.paths and name not in self.seeded}
+        if unseeded:
+            self.dirty |= unseeded
+            targets -= unseeded
+        if not targets:
+            return
 
-team_points = load_points()
+        files = {}
+        sources = {}  # path -> (table, shard, document as exported)
+        messages = set()
+        for name, shard in targets:
+            path, message, document = self.snapshot(name, shard)
+            files[path] = document
+            sources[path] = (name, shard, document)
+            messages.add(message)
+
+        try:
+            written = await self.store.commit_files(files, "; ".join(sorted(messages)))
+        except Exception:
+            self.dirty |= targets
+            raise
+
+        for path, (name, shard, sent) in sources.items():
+            if written[path] != sent:
+                self.apply_merge(name, shard, sent, written[path])
+
+    def apply_merge(self, name, shard, sent, merged):
+        """
+        Store what a commit merged in from GitHub, so the next export does not
+        drop it again. Local writes made since `sent` was exported are kept.
+        """
+        local = self.snapshot(name, shard)[2]
+        rows = merge_json(sent, local, merged)
+        removed = [key for key in local if key not in rows]
+        self.backend.update(name, rows, notify=False)
+        if removed:
+            self.backend.delete_many(name, removed, notify=False)
+        for listener in self.merge_listeners:
+            listener(name, rows, removed)
+        print(f"[REPLICA] Merged remote changes into {name}" + (f" ({shard})" if shard else ""))
+
+    async def fetch_shard(self, name, shard):
+        """
+        Rows of one shard from GitHub. Shards that were never exported fall
+        back to the legacy single-file document, filtered to that shard.
+        """
+        document = await self.store.fetch(self.shard_path(name, shard))
+        if document is None:
+            legacy_path = self.sharded[name][2]
+            legacy = (await self.store.fetch(legacy_path) or {}) if legacy_path else {}
+            document = {k: v for k, v in legacy.items() if self.shard_of(k) == shard}
+        return document
+
+    async def _seed_table(self, name):
+        # local rows are authoritative only if they were there before the first
+        # attempt; anything written after a failed seed is replaced by GitHub's copy
+        if name not in self.seed_attempted and self.backend.count(name):
+            self.seeded.add(name)
+            return
+        self.seed_attempted.add(name)
+
+        path = self.paths[name][0]
+        data = await self.store.fetch(path)
+        if name in self.seeded:
+            return  # seeded by a concurrent caller while we waited
+        if data:
+            self.backend.save(name, data, notify=False)
+            print(f"[STATE] Seeded {name} from GitHub ({len(data)} keys)")
+        self.seeded.add(name)
+
+    async def seed(self):
+        for name, (path, _) in self.paths.items():
+            if name in self.seeded:
+                continue
+            try:
+                await self._seed_table(name)
+            except Exception as e:
+                print(f"[STATE] Could not seed {name} from GitHub ({path}), will retry: {e}")
+
+    async def ensure_seeded(self, name):
+        """Seed `name` now if that failed earlier; raises while GitHub is unreachable."""
+        if name in self.paths and name not in self.seeded:
+            await self._seed_table(name)
+
+    async def close(self):
+        await self.writer.close()
+
+
+state = SQLiteStateBackend(STATE_DB_FILE)
+
+replicator = GitHubReplicator(
+    state,
+    gh_store,
+    {
+        "points": (GH_FILE, "update team points"),
+        "codeforces": (GH_CF_FILE, "update codeforces state"),
+        "leetcode": (GH_LC_FILE, "update leetcode state"),
+    },
+    sharded={
+        "todo": (GH_TODO_DIR, "update todo lists", GH_TODO_FILE),
+    }
+)
 
 # ============ LAST STAND GAME CONFIG =============
 LAST_STAND_FILE = "last_stand_game.json"
 
-def load_last_stand():
-    try:
-        with open(LAST_STAND_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {
-            "active": False,
-            "players": {},
-            "starting_lives": 3,
-            "pom_logs": []
+LAST_STAND_SNAPSHOT_EVERY = 50      # events between compacted snapshots
+LAST_STAND_POM_LOG_LIMIT = 100      # most recent pom logs kept in the game state
+
+LAST_STAND_DEFAULT = {
+    "active": False,
+    "players": {},
+    "starting_lives": 3,
+    "pom_logs": []
+}
+
+# The game is stored as a snapshot in the last_stand table plus an append-only
+# log of start/join/defend/attack/end events since that snapshot. Each action
+# costs one small append; the state is rebuilt by replaying the log on load.
+
+state.import_json_file("last_stand", LAST_STAND_FILE)
+
+def apply_last_stand_event(data, event):
+    """Apply one game event to `data` in place. Must stay deterministic for replay."""
+    kind = event["type"]
+
+    if kind in ("start", "end"):
+        data.clear()
+        data.update(copy.deepcopy(LAST_STAND_DEFAULT))
+        if kind == "start":
+            data["active"] = True
+            data["starting_lives"] = event["starting_lives"]
+        return
+
+    players = data["players"]
+
+    if kind == "join":
+        players[event["user_id"]] = {
+            "name": event["name"],
+            "lives": data["starting_lives"],
+            "defense_poms": 0,
+            "eliminated": False
         }
+        return
+
+    if kind == "defend":
+        players[event["user_id"]]["defense_poms"] += event["poms"]
+
+    elif kind == "attack":
+        target_player = players[event["target_id"]]
+        target_player["defense_poms"] -= event["blocked"]
+        target_player["lives"] -= event["damage"]
+
+        # Check if eliminated
+        if target_player["lives"] <= 0:
+            target_player["lives"] = 0
+            target_player["eliminated"] = True
+
+    data["pom_logs"].append(event)
+    del data["pom_logs"][:-LAST_STAND_POM_LOG_LIMIT]
+
+def load_last_stand():
+    data = state.load("last_stand", LAST_STAND_DEFAULT)
+    for seq, event in state.replay("last_stand_events", data.get("snapshot_seq", 0)):
+        apply_last_stand_event(data, event)
+        data["snapshot_seq"] = seq
+    return data
 
 def save_last_stand(data):
-    with open(LAST_STAND_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+    """Write a compacted snapshot and drop the events it already contains."""
+    state.save("last_stand", data)
+    state.truncate("last_stand_events", data.get("snapshot_seq", 0))
+
+def record_last_stand(event):
+    """Apply `event` to the live game and journal it, snapshotting every so often."""
+    apply_last_stand_event(last_stand_data, event)
+    seq = state.append("last_stand_events", event)
+
+    # start/end reset the game, so the log before them is dead weight
+    if event["type"] in ("start", "end") or seq - last_stand_data.get("snapshot_seq", 0) >= LAST_STAND_SNAPSHOT_EVERY:
+        last_stand_data["snapshot_seq"] = seq
+        save_last_stand(last_stand_data)
 
 last_stand_data = load_last_stand()
 
 # ============ JOURNAL REMINDER CONFIG =============
 JOURNAL_FILE = "journal_reminders.json"
 
+state.import_json_file("journal", JOURNAL_FILE)
+
 def load_journal_data():
-    try:
-        with open(JOURNAL_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
+    return state.load("journal")
 
-def save_journal_data(data):
-    with open(JOURNAL_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+def save_journal_data(user_id):
+    """Persist one user's journal settings."""
+    state.put("journal", user_id, journal_data[user_id])
 
 journal_data = load_journal_data()
 # Structure: { "user_id": { "enabled": bool, "journal_thread_id": int, "last_reminder_sent": "ISO_timestamp" } }
 
-# ============ TODO LIST CONFIG =============
-GH_TODO_FILE = os.getenv("GH_TODO_FILE_PATH", "todo_lists.json")
+JOURNAL_POST_WINDOW_SECONDS = 24 * 3600   # a post this recent means no reminder
+JOURNAL_BACKFILL_LIMIT = 200              # messages scanned per thread when backfilling
 
-todo_file_sha = None
+class JournalPostIndex:
+    """
+    Last post time (unix seconds) per (journal thread, user), kept current by
+    on_message so the reminder check is a dict lookup instead of a history
+    scan. Threads are scanned once per process to cover posts made while the
+    bot was offline.
+    """
 
-async def github_get_todo_data():
-    global todo_file_sha
+    def __init__(self, backend, table):
+        self.backend = backend
+        self.table = table
+        self.last_post = {}         # (thread_id, user_id) -> unix seconds
+        self.watched = set()        # thread ids of enabled journal reminders
+        self.backfilled = set()     # thread ids scanned this process
+        self.unreachable = set()    # thread ids the bot could not read when backfilling
+
+        for key, posted_at in backend.load(table).items():
+            thread_id, user_id = key.split(":", 1)
+            self.last_post[(int(thread_id), int(user_id))] = posted_at
+
+    def refresh_watched(self, journal):
+        self.watched = {
+            int(data["journal_thread_id"]) for data in journal.values()
+            if data.get("enabled") and data.get("journal_thread_id")
+        }
+        # posts in unwatched threads are not indexed, so rescan them if they come back
+        self.backfilled &= self.watched
+        self.unreachable &= self.watched
 
-    GH_TODO_API = f"https://api.github.com/repos/{os.getenv('GH_REPO_OWNER')}/{os.getenv('GH_REPO_NAME')}/contents/{GH_TODO_FILE}"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('GH_TOKEN')}",
-        "Accept": "application/vnd.github+json"
-    }
+    def record(self, thread_id, user_id, posted_at):
+        key = (thread_id, user_id)
+        if posted_at <= self.last_post.get(key, 0):
+            return
+        self.last_post[key] = posted_at
+        self.backend.put(self.table, f"{thread_id}:{user_id}", posted_at)
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(GH_TODO_API, headers=headers) as r:
-            text = await r.text()
-            if r.status == 200:
-                data = json.loads(text)
-                todo_file_sha = data["sha"]
-                content = base64.b64decode(data["content"]).decode()
-                return json.loads(content)
-            if r.status == 404:
-                await github_set_todo_data({})
-                return {}
-            raise RuntimeError(f"GitHub TODO GET failed ({r.status})\n{text}")
+    def last_post_time(self, thread_id, user_id):
+        return self.last_post.get((int(thread_id), int(user_id)))
 
+    def posted_recently(self, thread_id, user_id, now):
+        posted_at = self.last_post_time(thread_id, user_id)
+        return posted_at is not None and now - posted_at < JOURNAL_POST_WINDOW_SECONDS
 
-async def github_set_todo_data(data_dict):
-    global todo_file_sha
 
-    GH_TODO_API = f"https://api.github.com/repos/{os.getenv('GH_REPO_OWNER')}/{os.getenv('GH_REPO_NAME')}/contents/{GH_TODO_FILE}"
-    headers = {
-        "Authorization": f"Bearer {os.getenv('GH_TOKEN')}",
-        "Accept": "application/vnd.github+json"
-    }
+journal_posts = JournalPostIndex(state, "journal_posts")
+journal_posts.refresh_watched(journal_data)
 
-    encoded = base64.b64encode(json.dumps(data_dict, indent=4).encode()).decode()
-    payload = {"message": "update todo lists", "content": encoded}
-    if todo_file_sha:
-        payload["sha"] = todo_file_sha
+# ============ TODO LIST CONFIG =============
 
-    async with aiohttp.ClientSession() as session:
-        async with session.put(GH_TODO_API, headers=headers, json=payload) as r:
-            if r.status not in (200, 201):
-                text = await r.text()
-                raise RuntimeError(f"GitHub TODO PUT failed ({r.status})\n{text}")
-            resp = await r.json()
-            todo_file_sha = resp["content"]["sha"]
+# In-memory cache — filled one channel at a time; each list is persisted by key and
+# replicated to GitHub as one shard file per channel
+todo_data: dict = {}
+todo_loaded_channels = set()
+todo_loading = {}  # channel id -> in-flight load task
 
+async def _load_todo_channel(channel_id):
+    rows = state.load_prefix("todo", f"{channel_id}:")
+    if not rows:
+        try:
+            rows = await replicator.fetch_shard("todo", str(channel_id))
+        except Exception as e:
+            print(f"[TODO] Could not fetch shard for channel {channel_id}: {e}")
+            return False
+        # never replace a list that was written while the shard was in flight
+        rows = {key: value for key, value in rows.items() if state.get("todo", key) is None}
+        state.update("todo", rows, notify=False)
+
+    for key, value in rows.items():
+        todo_data.setdefault(key, value)
+    todo_loaded_channels.add(channel_id)
+    print(f"[TODO] Loaded {len(rows)} todo lists for channel {channel_id}")
+    return True
+
+async def ensure_todo_channel(channel_id):
+    """
+    Load a channel's todo lists the first time it is touched. Returns False if
+    they could not be loaded; callers must not write the channel until they
+    are, or the replica would overwrite the GitHub shard with a partial list.
+    Concurrent callers share one load.
+    """
+    if channel_id in todo_loaded_channels:
+        return True
+
+    task = todo_loading.get(channel_id)
+    if task is None:
+        task = todo_loading[channel_id] = asyncio.create_task(_load_todo_channel(channel_id))
+        task.add_done_callback(lambda _: todo_loading.pop(channel_id, None))
+    # shielded: one caller giving up must not cancel the load for the others
+    return await asyncio.shield(task)
+
+def apply_merged_todo(name, rows, removed):
+    """Keep the in-memory lists of loaded channels in step with merged replica rows."""
+    if name != "todo":
+        return
+    for key, value in rows.items():
+        if int(key.split(":", 1)[0]) not in todo_loaded_channels:
+            continue
+        if key in todo_data:
+            # in place, so handlers holding the list see the merge
+            todo_data[key].clear()
+            todo_data[key].update(value)
+        else:
+            todo_data[key] = value
+    for key in removed:
+        todo_data.pop(key, None)
 
-# In-memory cache — loaded on bot ready, written through to GitHub on every change
-todo_data: dict = {}
+replicator.merge_listeners.append(apply_merged_todo)
 
-async def save_todo_data():
-    """Write the in-memory todo_data dict to GitHub."""
-    try:
-        await github_set_todo_data(todo_data)
-    except Exception as e:
-        print(f"[TODO] GitHub save failed: {e}")
+async def save_todo_data(key):
+    """Persist one channel:user todo list; never waits on GitHub."""
+    state.put("todo", key, todo_data[key])
 
 # Structure:
 # {
@@ -174,23 +961,22 @@ intents.message_content = True
 bot = commands.Bot(command_prefix="!", intents=intents)
 tree = bot.tree
 
-# Track user monitoring tasks
-initial_checks = {}
-post_stream_checks = {}
-
 print("TOKEN LOADED?:", TOKEN is not None)
 
 # =====================================================
 #                      DM HELPER
 # =====================================================
 async def safe_dm(member: discord.Member, embed: discord.Embed):
+    """Send a DM; returns whether it went through."""
     try:
         await member.send(embed=embed)
         print(f"[DM] Sent DM to {member}")
+        return True
     except discord.Forbidden:
         print(f"[DM] Cannot DM {member}")
     except Exception as e:
         print(f"[DM] Error:", e)
+    return False
 
 
 # =====================================================
@@ -238,11 +1024,90 @@ def make_post_stream_kick_embed(member, vc):
 #                 HELPER FUNCTIONS
 # =====================================================
 
+VoiceEntry = namedtuple("VoiceEntry", "channel_id self_stream self_video bot")
+
+
+class VoiceIndex:
+    """
+    Who is in voice right now, per guild and per channel.
+
+    Seeded once from the voice channels at startup and kept current by
+    on_voice_state_update, so "is X in voice / streaming" is a dict lookup
+    instead of a scan of guild.members.
+    """
+
+    def __init__(self):
+        self.guilds = {}    # guild_id -> {member_id: VoiceEntry}
+        self.channels = {}  # channel_id -> {member_id, ...}
+
+    def get(self, guild_id, member_id):
+        return self.guilds.get(guild_id, {}).get(member_id)
+
+    def guild_members(self, guild_id):
+        return self.guilds.get(guild_id, {})
+
+    def channel_members(self, channel_id):
+        return self.channels.get(channel_id, set())
+
+    def human_member_ids(self):
+        return {
+            member_id
+            for members in self.guilds.values()
+            for member_id, entry in members.items()
+            if not entry.bot
+        }
+
+    def _remove(self, guild_id, member_id):
+        entry = self.guilds.get(guild_id, {}).pop(member_id, None)
+        if entry:
+            members = self.channels.get(entry.channel_id)
+            if members is not None:
+                members.discard(member_id)
+                if not members:
+                    del self.channels[entry.channel_id]
+        return entry
+
+    def update(self, member, voice):
+        """Record `member`'s current voice state; no channel means they left voice."""
+        guild_id = member.guild.id
+        self._remove(guild_id, member.id)
+        if voice is None or voice.channel is None:
+            return
+
+        self.guilds.setdefault(guild_id, {})[member.id] = VoiceEntry(
+            voice.channel.id, bool(voice.self_stream), bool(voice.self_video), member.bot
+        )
+        self.channels.setdefault(voice.channel.id, set()).add(member.id)
+
+    def seed(self, guild):
+        """Rebuild one guild's entries from its voice channels."""
+        for member_id in list(self.guilds.get(guild.id, {})):
+            self._remove(guild.id, member_id)
+        for vc in guild.voice_channels + guild.stage_channels:
+            for member in vc.members:
+                self.update(member, member.voice)
+
+
+voice_index = VoiceIndex()
+
 def has_required_activity(member):
-    if not member.voice:
-        return False
-    vs = member.voice
-    return vs.self_stream or vs.self_video
+    entry = voice_index.get(member.guild.id, member.id)
+    return bool(entry and (entry.self_stream or entry.self_video))
+
+def unverified_member_in(guild, member_id, vc_id):
+    """
+    The member, if enforcement still applies to them in `vc_id`: they are there
+    with neither camera nor stream on, the channel is still monitored and they
+    hold no exempt role (settings may have changed since a deadline was set).
+    """
+    entry = voice_index.get(guild.id, member_id)
+    if not entry or entry.channel_id != vc_id or entry.self_stream or entry.self_video:
+        return None
+    cfg = enforcement_config.for_channel(guild.id, vc_id)
+    member = cfg and guild.get_member(member_id)
+    if not member or is_enforcement_exempt(member, cfg):
+        return None
+    return member
 
 async def assign_balanced_teams(guild: discord.Guild, event_name: str, team_x_role_id: int, team_y_role_id: int):
     team_x_role = guild.get_role(team_x_role_id)
@@ -294,62 +1159,492 @@ TEAM_Y_ROLE = 1444727513489215641
 #                 BACKGROUND TASKS
 # =====================================================
 
-async def initial_check_task(member, vc_id):
-    await asyncio.sleep(INITIAL_WAIT_SECONDS)
-    
-    mem = member.guild.get_member(member.id)
-    if not mem or not mem.voice or mem.voice.channel.id != vc_id:
-        return
+# Outbound enforcement actions, in priority order, with their token bucket
+# (tokens per second, burst). Removals go out before DMs.
+ACTION_ROUTES = {
+    "kick": (1.0, 5),
+    "dm": (1.0, 5),
+}
+ACTION_QUEUE_MAX = 10000
 
-    if has_required_activity(mem):
-        return
 
-    embed = make_initial_kick_embed(mem, mem.voice.channel)
-    await safe_dm(mem, embed)
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time_module.monotonic()
 
-    try:
-        await mem.move_to(None, reason="No cam/stream after initial window")
-    except Exception as e:
-        print("[MOVE ERROR]", e)
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
 
+    def take(self, now):
+        self._refill(now)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
 
-async def post_stream_reminder_task(member, vc_id):
-    await asyncio.sleep(REMINDER_WAIT_SECONDS)
+    def wait_time(self, now):
+        self._refill(now)
+        return max(0.0, (1 - self.tokens) / self.rate)
 
-    mem = member.guild.get_member(member.id)
-    if not mem or not mem.voice or mem.voice.channel.id != vc_id:
-        return
 
-    if has_required_activity(mem):
-        return
+class ActionQueue:
+    """
+    Central queue for enforcement DMs and removals.
+
+    Each route drains through its own token bucket so a mass enforcement
+    event goes out at the allowed rate instead of tripping 429s, higher
+    priority routes go first, and a second action of the same kind for the
+    same member is dropped while the first is still queued. An action may
+    carry a check that is re-evaluated right before it runs, and counts as
+    failed if it returns False.
+    """
 
-    embed = make_reminder_embed(mem, mem.voice.channel)
-    await safe_dm(mem, embed)
+    def __init__(self, routes, max_size):
+        self.max_size = max_size
+        self.queues = {route: OrderedDict() for route in routes}  # route -> {(member_id, kind): (action, check)}
+        self.buckets = {route: TokenBucket(rate, burst) for route, (rate, burst) in routes.items()}
+        self.sent = Counter()
+        self.dropped = Counter()
+        self._wake = None   # created on first use, inside the running loop
+        self._task = None
+        self._running = set()
+
+    def depth(self):
+        return {route: len(queue) for route, queue in self.queues.items()}
+
+    def submit(self, route, member_id, kind, action, check=None):
+        queue = self.queues[route]
+        key = (member_id, kind)
+        if key in queue:
+            self.dropped["duplicate"] += 1
+            return
+        if sum(len(q) for q in self.queues.values()) >= self.max_size:
+            self.dropped["full"] += 1
+            return
 
+        queue[key] = (action, check)
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        self._wake.set()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while any(self.queues.values()):
+            now = time_module.monotonic()
+            wait = None
+            for route, queue in self.queues.items():
+                if not queue:
+                    continue
+                key, (action, check) = next(iter(queue.items()))
+                if check and not check():
+                    # no longer needed; costs no token
+                    del queue[key]
+                    self.dropped["stale"] += 1
+                    break
+                bucket = self.buckets[route]
+                if bucket.take(now):
+                    del queue[key]
+                    task = asyncio.create_task(self._execute(route, key, action))
+                    self._running.add(task)
+                    task.add_done_callback(self._running.discard)
+                    break
+                route_wait = bucket.wait_time(now)
+                wait = route_wait if wait is None else min(wait, route_wait)
+            else:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.sleep(0)
+
+    async def _execute(self, route, key, action):
+        member_id, kind = key
+        try:
+            if await action() is False:
+                self.dropped["failed"] += 1
+                return
+            self.sent[route] += 1
+        except Exception as e:
+            self.dropped["failed"] += 1
+            print(f"[ACTIONS] {route} ({kind}) for {member_id} failed: {e}")
+
+
+action_queue = ActionQueue(ACTION_ROUTES, ACTION_QUEUE_MAX)
+
+def still_unverified_check(mem, vc):
+    """Re-checked when a queued action actually goes out."""
+    return lambda: unverified_member_in(mem.guild, mem.id, vc.id) is not None
+
+
+def queue_removal(mem, vc, reason, embed):
+    """Remove `mem` from `vc`; the removal DM is only queued once the removal went through."""
+    async def remove():
+        await mem.move_to(None, reason=reason)
+        action_queue.submit("dm", mem.id, "removed", functools.partial(safe_dm, mem, embed))
+
+    action_queue.submit("kick", mem.id, "removal", remove, still_unverified_check(mem, vc))
+
+
+def initial_check(mem, vc):
+    queue_removal(mem, vc, "No cam/stream after initial window", make_initial_kick_embed(mem, vc))
+
+
+def post_stream_reminder(mem, vc):
+    action_queue.submit(
+        "dm", mem.id, "reminder",
+        functools.partial(safe_dm, mem, make_reminder_embed(mem, vc)),
+        still_unverified_check(mem, vc)
+    )
+
+
+def post_stream_kick(mem, vc):
+    queue_removal(mem, vc, "Did not turn cam/stream back on", make_post_stream_kick_embed(mem, vc))
+
+
+ENFORCEMENT_ACTIONS = {
+    "initial": initial_check,
+    "reminder": post_stream_reminder,
+    "kick": post_stream_kick,
+}
+
+Deadline = namedtuple("Deadline", "due kind guild_id member_id channel_id")
+
+
+class DeadlineScheduler:
+    """
+    Voice enforcement deadlines in one min-heap, driven by a single task.
+
+    Each member has at most one pending deadline per kind. Cancelling or
+    replacing one drops it from the per-member map in O(1) and leaves a stale
+    entry in the heap, which is skipped when it reaches the top; once stale
+    entries make up half the heap it is rebuilt from the live ones.
+
+    Pending deadlines are mirrored into a state table as
+    "member_id:kind" -> [guild_id, channel_id, due] so they survive restarts.
+    """
+
+    def __init__(self, handler, backend=None, table=None):
+        self.handler = handler      # handler(deadline), called when it falls due
+        self.backend = backend
+        self.table = table
+        self.restored = False
+        self.heap = []              # (due, seq, Deadline)
+        self.pending = {}           # member_id -> {kind: Deadline}
+        self.counts = Counter()     # kind -> pending deadlines
+        self.seq = 0
+        self.stale = 0              # heap entries no longer pending
+        self._wake = None           # created on first use, inside the running loop
+        self._task = None
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def _event(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        return self._wake
+
+    def wake(self):
+        """Make the driver re-check the earliest deadline."""
+        self._event().set()
+
+    def _is_pending(self, deadline):
+        return self.pending.get(deadline.member_id, {}).get(deadline.kind) is deadline
+
+    @staticmethod
+    def _key(member_id, kind):
+        return f"{member_id}:{kind}"
+
+    def _remove(self, member_id, kind, persist=True):
+        kinds = self.pending.get(member_id)
+        if not kinds or kind not in kinds:
+            return False
+        del kinds[kind]
+        self.counts[kind] -= 1
+        if not kinds:
+            del self.pending[member_id]
+        if persist and self.backend:
+            self.backend.delete(self.table, self._key(member_id, kind))
+        return True
+
+    def _compact(self):
+        if self.stale > 64 and 2 * self.stale > len(self.heap):
+            self.heap = [item for item in self.heap if self._is_pending(item[2])]
+            heapq.heapify(self.heap)
+            self.stale = 0
+
+    def _add(self, deadline):
+        if self._remove(deadline.member_id, deadline.kind, persist=False):
+            self.stale += 1
+        self.pending.setdefault(deadline.member_id, {})[deadline.kind] = deadline
+        self.counts[deadline.kind] += 1
+
+        self.seq += 1
+        heapq.heappush(self.heap, (deadline.due, self.seq, deadline))
+        self._compact()
+        if self.heap[0][2] is deadline:
+            self.wake()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def schedule(self, kind, member, channel_id, delay):
+        """Set (or replace) `member`'s `kind` deadline, `delay` seconds from now."""
+        deadline = Deadline(time_module.time() + delay, kind, member.guild.id, member.id, channel_id)
+        self._add(deadline)
+        if self.backend:
+            self.backend.put(
+                self.table, self._key(member.id, kind), [deadline.guild_id, channel_id, deadline.due]
+            )
+
+    def restore(self):
+        """
+        Re-arm the deadlines persisted before a restart (once per process).
+        Returns the ones that fell due in the meantime, oldest first; those
+        are dropped from storage and left to the caller.
+        """
+        if self.restored or not self.backend:
+            return []
+        self.restored = True
+
+        now = time_module.time()
+        expired = []
+        for key, (guild_id, channel_id, due) in self.backend.load(self.table).items():
+            member_id, kind = key.split(":", 1)
+            if kind not in ENFORCEMENT_ACTIONS:
+                continue
+            deadline = Deadline(due, kind, guild_id, int(member_id), channel_id)
+            if due <= now:
+                expired.append(deadline)
+            else:
+                self._add(deadline)
+
+        if expired:
+            self.backend.delete_many(
+                self.table, [self._key(d.member_id, d.kind) for d in expired], notify=False
+            )
+        return sorted(expired)
+
+    def cancel_channel(self, channel_id):
+        """Cancel every deadline set in `channel_id`."""
+        for member_id, kinds in list(self.pending.items()):
+            if any(d.channel_id == channel_id for d in kinds.values()):
+                self.cancel(member_id)
+
+    def cancel(self, member_id, kinds=ENFORCEMENT_ACTIONS):
+        for kind in kinds:
+            if self._remove(member_id, kind):
+                self.stale += 1
+        self._compact()
+
+    async def _run(self):
+        while self.heap:
+            due, _, deadline = self.heap[0]
+            if not self._is_pending(deadline):
+                heapq.heappop(self.heap)
+                self.stale -= 1
+                continue
 
-async def post_stream_kick_task(member, vc_id):
-    await asyncio.sleep(KICK_WAIT_AFTER_REMINDER)
+            delay = due - time_module.time()
+            if delay > 0:
+                wake = self._event()
+                wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
 
-    mem = member.guild.get_member(member.id)
-    if not mem or not mem.voice or mem.voice.channel.id != vc_id:
+            heapq.heappop(self.heap)
+            self._remove(deadline.member_id, deadline.kind)
+            try:
+                self.handler(deadline)
+            except Exception as e:
+                print(f"[ENFORCE] {deadline.kind} deadline for {deadline.member_id} failed: {e}")
+
+
+def run_enforcement_deadline(deadline: Deadline):
+    guild = bot.get_guild(deadline.guild_id)
+    if not guild:
         return
 
-    if has_required_activity(mem):
+    mem = unverified_member_in(guild, deadline.member_id, deadline.channel_id)
+    vc = guild.get_channel(deadline.channel_id)
+    if not mem or not vc:
         return
 
-    embed = make_post_stream_kick_embed(mem, mem.voice.channel)
-    await safe_dm(mem, embed)
+    ENFORCEMENT_ACTIONS[deadline.kind](mem, vc)
+
+
+enforcement = DeadlineScheduler(run_enforcement_deadline, state, "enforcement")
 
-    try:
-        await mem.move_to(None, reason="Did not turn cam/stream back on")
-    except Exception as e:
-        print("[MOVE ERROR]", e)
+
+def catch_up_enforcement(expired):
+    """Queue, in one pass, the deadlines that fell due while the bot was offline."""
+    kicks = {d.member_id for d in expired if d.kind == "kick"}
+    applied = 0
+    for deadline in expired:
+        # a reminder is moot once the kick it announces is due as well
+        if deadline.kind == "reminder" and deadline.member_id in kicks:
+            continue
+        guild = bot.get_guild(deadline.guild_id)
+        mem = guild and unverified_member_in(guild, deadline.member_id, deadline.channel_id)
+        vc = guild and guild.get_channel(deadline.channel_id)
+        if not mem or not vc:
+            continue
+        applied += 1
+        ENFORCEMENT_ACTIONS[deadline.kind](mem, vc)
+
+    print(f"[ENFORCE] Caught up on {len(expired)} expired deadlines, {applied} applied")
+
+
+def restore_enforcement():
+    """Re-arm persisted deadlines and give an initial window to anyone in a
+    monitored VC without cam/stream who has no deadline pending."""
+    expired = enforcement.restore()
+    if expired:
+        catch_up_enforcement(expired)
+
+    handled = {d.member_id for d in expired}
+    for guild in bot.guilds:
+        cfg = enforcement_config.for_guild(guild.id)
+        for channel_id in cfg.channels:
+            arm_channel_occupants(guild, channel_id, cfg, handled)
+
+
+def arm_channel_occupants(guild, channel_id, cfg, skip=()):
+    """Start the initial window for everyone already sitting in a monitored VC
+    without cam/stream, unless they are exempt or already on the clock."""
+    for member_id in voice_index.channel_members(channel_id):
+        entry = voice_index.get(guild.id, member_id)
+        if member_id in enforcement.pending or member_id in skip:
+            continue
+        if entry.bot or entry.self_stream or entry.self_video:
+            continue
+        member = guild.get_member(member_id)
+        if member and not is_enforcement_exempt(member, cfg):
+            enforcement.schedule("initial", member, channel_id, cfg.initial_wait)
+
+
+# =====================================================
+#              VC ENFORCEMENT CONFIG
+# =====================================================
+
+GuildEnforcement = namedtuple("GuildEnforcement", "channels initial_wait reminder_wait kick_wait exempt_roles")
+
+DEFAULT_ENFORCEMENT = GuildEnforcement(
+    frozenset(MONITORED_VC_IDS),
+    INITIAL_WAIT_SECONDS,
+    REMINDER_WAIT_SECONDS,
+    KICK_WAIT_AFTER_REMINDER,
+    frozenset()
+)
+
+
+class EnforcementConfig:
+    """
+    Per-guild enforcement settings, kept in the enforcement_config state
+    table (guild id -> settings) and cached here, so on_voice_state_update
+    only does set lookups. Guilds without stored settings use the module
+    defaults above.
+    """
+
+    def __init__(self, backend, table):
+        self.backend = backend
+        self.table = table
+        self.guilds = {}  # guild_id -> GuildEnforcement
+        self.reload()
+
+    def reload(self):
+        self.guilds = {
+            int(guild_id): GuildEnforcement(
+                frozenset(data["channels"]),
+                data["initial_wait"],
+                data["reminder_wait"],
+                data["kick_wait"],
+                frozenset(data["exempt_roles"])
+            )
+            for guild_id, data in self.backend.load(self.table).items()
+        }
+
+    def for_guild(self, guild_id):
+        return self.guilds.get(guild_id, DEFAULT_ENFORCEMENT)
+
+    def for_channel(self, guild_id, channel_id):
+        """The guild's settings if `channel_id` is monitored, else None."""
+        cfg = self.for_guild(guild_id)
+        return cfg if channel_id in cfg.channels else None
+
+    def update(self, guild_id, **changes):
+        cfg = self.for_guild(guild_id)._replace(**changes)
+        self.guilds[guild_id] = cfg
+        self.backend.put(self.table, guild_id, {
+            "channels": sorted(cfg.channels),
+            "initial_wait": cfg.initial_wait,
+            "reminder_wait": cfg.reminder_wait,
+            "kick_wait": cfg.kick_wait,
+            "exempt_roles": sorted(cfg.exempt_roles)
+        })
+        return cfg
+
+
+enforcement_config = EnforcementConfig(state, "enforcement_config")
+
+def is_enforcement_exempt(member, cfg):
+    return any(role.id in cfg.exempt_roles for role in member.roles)
 
 
 # =====================================================
 #              JOURNAL REMINDER BACKGROUND TASK
 # =====================================================
 
+async def backfill_journal_thread(thread_id):
+    """
+    Index the last day of posts in one journal thread, once per process.
+    Returns whether the thread's index can be trusted; transient failures
+    leave it unindexed so the next call scans again.
+    """
+    if thread_id in journal_posts.backfilled:
+        return thread_id not in journal_posts.unreachable
+
+    try:
+        thread = bot.get_channel(thread_id) or await bot.fetch_channel(thread_id)
+        if isinstance(thread, discord.Thread):
+            since = discord.utils.utcnow() - timedelta(seconds=JOURNAL_POST_WINDOW_SECONDS)
+            async for message in thread.history(limit=JOURNAL_BACKFILL_LIMIT, after=since):
+                if not message.author.bot:
+                    journal_posts.record(thread_id, message.author.id, message.created_at.timestamp())
+            reachable = True
+        else:
+            print(f"[JOURNAL] Channel {thread_id} is not a thread")
+            reachable = False
+    except (discord.Forbidden, discord.NotFound) as e:
+        print(f"[JOURNAL] Cannot read thread {thread_id}: {e}")
+        reachable = False
+    except Exception as e:
+        print(f"[JOURNAL] Could not index thread {thread_id}, will retry: {e}")
+        return False
+
+    journal_posts.backfilled.add(thread_id)
+    if reachable:
+        journal_posts.unreachable.discard(thread_id)
+    else:
+        journal_posts.unreachable.add(thread_id)
+    return reachable
+
+
+async def backfill_journal_posts():
+    for thread_id in list(journal_posts.watched):
+        await backfill_journal_thread(thread_id)
+    print(f"[JOURNAL] Indexed posts in {len(journal_posts.backfilled)} journal threads")
+
+
 @tasks.loop(minutes=5)
 async def check_journal_reminders():
     """Check every 5 minutes if it's between 9 PM and 9:30 PM IST and send reminders"""
@@ -365,9 +1660,6 @@ async def check_journal_reminders():
         # Get today's date in IST (just the date part)
         today_date = now_ist.date()
         
-        # Calculate 24 hours ago in UTC for message checking
-        twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-        
         # Check if we need to send reminders
         for user_id, data in list(journal_data.items()):
             # Skip if reminders disabled
@@ -397,76 +1689,46 @@ async def check_journal_reminders():
                     print(f"[JOURNAL] Error parsing last_reminder for {user_id}: {e}")
             
             # Check if user posted in their journal thread in the last 24 hours
-            needs_reminder = False
+            # (no REST calls once the thread has been indexed)
+            if not await backfill_journal_thread(int(journal_thread_id)):
+                print(f"[JOURNAL] Thread {journal_thread_id} for user {user_id} is not indexed, skipping")
+                continue
+
+            if journal_posts.posted_recently(journal_thread_id, user_id, time_module.time()):
+                print(f"[JOURNAL] User {user_id} has posted in the last 24 hours, no reminder needed")
+                continue
+
+            print(f"[JOURNAL] User {user_id} has NOT posted in the last 24 hours")
             
             try:
-                # Get the journal thread
-                thread = bot.get_channel(int(journal_thread_id))
+                user = await bot.fetch_user(int(user_id))
                 
-                # If not in cache, try to fetch it
-                if not thread:
-                    try:
-                        thread = await bot.fetch_channel(int(journal_thread_id))
-                    except:
-                        print(f"[JOURNAL] Cannot find thread {journal_thread_id} for user {user_id}")
-                        continue
+                # Get thread name for the reminder
+                thread_mention = f"<#{journal_thread_id}>"
                 
-                # Check if it's actually a thread
-                if not isinstance(thread, discord.Thread):
-                    print(f"[JOURNAL] Channel {journal_thread_id} is not a thread for user {user_id}")
-                    continue
+                embed = discord.Embed(
+                    title="📔 Journal Reminder",
+                    description=(
+                        f"Hey! It looks like you haven't posted in {thread_mention} in the last 24 hours.\n\n"
+                        "Take a moment to reflect on your day and write down your thoughts! 💭"
+                    ),
+                    color=0x5865F2,
+                    timestamp=datetime.utcnow()
+                )
                 
-                # Search for messages from this user in the last 24 hours
-                has_posted = False
-                async for message in thread.history(limit=200, after=twenty_four_hours_ago):
-                    if message.author.id == int(user_id):
-                        has_posted = True
-                        print(f"[JOURNAL] User {user_id} posted in thread at {message.created_at}")
-                        break
+                await user.send(embed=embed)
+                
+                # Mark that we sent a reminder
+                journal_data[user_id]["last_reminder_sent"] = datetime.utcnow().isoformat()
+                save_journal_data(user_id)
+                
+                print(f"[JOURNAL] ✅ Sent reminder to user {user_id}")
                 
-                if not has_posted:
-                    needs_reminder = True
-                    print(f"[JOURNAL] User {user_id} has NOT posted in the last 24 hours")
-                else:
-                    print(f"[JOURNAL] User {user_id} has posted in the last 24 hours, no reminder needed")
-                    
             except discord.Forbidden:
-                print(f"[JOURNAL] No permission to read thread {journal_thread_id}")
-                continue
+                print(f"[JOURNAL] ❌ Cannot DM user {user_id}")
             except Exception as e:
-                print(f"[JOURNAL] Error checking messages for user {user_id}: {e}")
-                continue
-            
-            if needs_reminder:
-                try:
-                    user = await bot.fetch_user(int(user_id))
-                    
-                    # Get thread name for the reminder
-                    thread_mention = f"<#{journal_thread_id}>" if thread else "your journal thread"
-                    
-                    embed = discord.Embed(
-                        title="📔 Journal Reminder",
-                        description=(
-                            f"Hey! It looks like you haven't posted in {thread_mention} in the last 24 hours.\n\n"
-                            "Take a moment to reflect on your day and write down your thoughts! 💭"
-                        ),
-                        color=0x5865F2,
-                        timestamp=datetime.utcnow()
-                    )
-                    
-                    await user.send(embed=embed)
-                    
-                    # Mark that we sent a reminder
-                    journal_data[user_id]["last_reminder_sent"] = datetime.utcnow().isoformat()
-                    save_journal_data(journal_data)
-                    
-                    print(f"[JOURNAL] ✅ Sent reminder to user {user_id}")
-                    
-                except discord.Forbidden:
-                    print(f"[JOURNAL] ❌ Cannot DM user {user_id}")
-                except Exception as e:
-                    print(f"[JOURNAL] ❌ Error sending reminder to {user_id}: {e}")
-        
+                print(f"[JOURNAL] ❌ Error sending reminder to {user_id}: {e}")
+    
         print(f"[JOURNAL] Finished checking reminders")
 
 
@@ -478,14 +1740,18 @@ async def check_journal_reminders():
 async def on_ready():
     print(f"Logged in as {bot.user}")
 
-    # Load todo data from GitHub into memory
-    global todo_data
-    try:
-        todo_data = await github_get_todo_data()
-        print(f"[TODO] Loaded {len(todo_data)} todo lists from GitHub")
-    except Exception as e:
-        print(f"[TODO] Failed to load from GitHub, starting empty: {e}")
-        todo_data = {}
+    # Fill empty local tables from the GitHub replica (todo shards load lazily per channel)
+    await replicator.seed()
+
+    # Index who is already in voice and reconcile stored sessions with it
+    reconcile_voice_sessions("ready")
+    restore_enforcement()
+    if not update_activity_tracking.is_running():
+        update_activity_tracking.start()
+        print("[ACTIVITY] Activity tracking task started")
+
+    # Index recent journal posts (once per process) before reminders rely on them
+    await backfill_journal_posts()
 
     # Start the journal reminder task
     if not check_journal_reminders.is_running():
@@ -502,51 +1768,138 @@ async def on_ready():
     bot.add_view(TeamJoinView("default_event"))
 
 
+@bot.event
+async def on_resumed():
+    # voice state changes may have been missed while the gateway was down
+    reconcile_voice_sessions("resume")
+
+
 @bot.event
 async def on_voice_state_update(member, before, after):
-    # Leaving monitored VC
-    if before.channel and before.channel.id in MONITORED_VC_IDS:
-        if not after.channel or after.channel.id not in MONITORED_VC_IDS:
-            if member.id in initial_checks:
-                initial_checks[member.id].cancel()
-                initial_checks.pop(member.id)
+    voice_index.update(member, after)
+    track_voice_activity(member, before, after)
 
-            if member.id in post_stream_checks:
-                for t in post_stream_checks[member.id].values():
-                    t.cancel()
-                post_stream_checks.pop(member.id)
+    before_cfg = before.channel and enforcement_config.for_channel(member.guild.id, before.channel.id)
+    after_cfg = after.channel and enforcement_config.for_channel(member.guild.id, after.channel.id)
+
+    # Leaving monitored VC
+    if before_cfg and not after_cfg:
+        enforcement.cancel(member.id)
 
     # Joining monitored VC
-    if after.channel and after.channel.id in MONITORED_VC_IDS and not before.channel:
-        if not has_required_activity(member):
-            task = asyncio.create_task(initial_check_task(member, after.channel.id))
-            initial_checks[member.id] = task
+    if after_cfg and not before.channel:
+        if not has_required_activity(member) and not is_enforcement_exempt(member, after_cfg):
+            enforcement.schedule("initial", member, after.channel.id, after_cfg.initial_wait)
 
     before_active = before.self_stream or before.self_video if before else False
     after_active = after.self_stream or after.self_video if after else False
 
     # Turned ON stream/cam
     if not before_active and after_active:
-        if member.id in initial_checks:
-            initial_checks[member.id].cancel()
-            initial_checks.pop(member.id)
-
-        if member.id in post_stream_checks:
-            for t in post_stream_checks[member.id].values():
-                t.cancel()
-            post_stream_checks.pop(member.id)
+        enforcement.cancel(member.id)
 
     # Turned OFF stream/cam
     if before_active and not after_active:
-        if after.channel and after.channel.id in MONITORED_VC_IDS:
-            if member.id in post_stream_checks:
-                for t in post_stream_checks[member.id].values():
-                    t.cancel()
-                post_stream_checks.pop(member.id)
+        if after_cfg and not is_enforcement_exempt(member, after_cfg):
+            enforcement.schedule("reminder", member, after.channel.id, after_cfg.reminder_wait)
+            enforcement.schedule("kick", member, after.channel.id, after_cfg.kick_wait)
+
+
+# =====================================================
+#              VC ENFORCEMENT CONFIG COMMANDS
+# =====================================================
+
+def make_vcconfig_embed(guild, cfg):
+    channels = "\n".join(f"<#{channel_id}>" for channel_id in sorted(cfg.channels)) or "None"
+    exempt = ", ".join(f"<@&{role_id}>" for role_id in sorted(cfg.exempt_roles)) or "None"
+    embed = discord.Embed(title=f"🎥 VC Enforcement • {guild.name}", color=0x5865F2)
+    embed.add_field(name="Monitored Channels", value=channels, inline=False)
+    embed.add_field(
+        name="Timeouts",
+        value=(
+            f"**Initial:** {format_time(cfg.initial_wait)}\n"
+            f"**Reminder:** {format_time(cfg.reminder_wait)}\n"
+            f"**Kick:** {format_time(cfg.kick_wait)}"
+        ),
+        inline=True
+    )
+    embed.add_field(name="Exempt Roles", value=exempt, inline=True)
+    return embed
+
+
+@tree.command(name="vcconfig", description="Show this server's voice enforcement settings")
+async def vcconfig(interaction: discord.Interaction):
+    if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
+        return await interaction.response.send_message("You cannot use this command.", ephemeral=True)
+
+    cfg = enforcement_config.for_guild(interaction.guild.id)
+    await interaction.response.send_message(embed=make_vcconfig_embed(interaction.guild, cfg), ephemeral=True)
+
+
+@tree.command(name="vcconfig_channel", description="Start or stop enforcing cam/stream in a voice channel")
+@app_commands.describe(channel="The voice channel", monitored="True to enforce, False to stop")
+async def vcconfig_channel(interaction: discord.Interaction, channel: discord.VoiceChannel, monitored: bool):
+    if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
+        return await interaction.response.send_message("You cannot use this command.", ephemeral=True)
+
+    cfg = enforcement_config.for_guild(interaction.guild.id)
+    if monitored:
+        channels = cfg.channels | {channel.id}
+    else:
+        channels = cfg.channels - {channel.id}
+        # nobody in the channel is on the clock any more
+        enforcement.cancel_channel(channel.id)
+
+    cfg = enforcement_config.update(interaction.guild.id, channels=channels)
+    if monitored:
+        # people already in the channel get the same window as a fresh join
+        arm_channel_occupants(interaction.guild, channel.id, cfg)
+    await interaction.response.send_message(embed=make_vcconfig_embed(interaction.guild, cfg), ephemeral=True)
+
+
+@tree.command(name="vcconfig_timeouts", description="Change the voice enforcement timeouts (seconds)")
+@app_commands.describe(
+    initial="Time to turn on cam/stream after joining",
+    reminder="Time after cam/stream goes off before the reminder DM",
+    kick="Time after cam/stream goes off before removal"
+)
+async def vcconfig_timeouts(
+    interaction: discord.Interaction,
+    initial: app_commands.Range[int, 10, 3600] = None,
+    reminder: app_commands.Range[int, 10, 3600] = None,
+    kick: app_commands.Range[int, 10, 3600] = None
+):
+    if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
+        return await interaction.response.send_message("You cannot use this command.", ephemeral=True)
+
+    cfg = enforcement_config.for_guild(interaction.guild.id)
+    changes = {
+        "initial_wait": initial if initial is not None else cfg.initial_wait,
+        "reminder_wait": reminder if reminder is not None else cfg.reminder_wait,
+        "kick_wait": kick if kick is not None else cfg.kick_wait
+    }
+    if changes["kick_wait"] < changes["reminder_wait"]:
+        return await interaction.response.send_message("The kick can't come before the reminder!", ephemeral=True)
 
-            reminder = asyncio.create_task(post_stream_reminder_task(member, after.channel.id))
-            kick = asyncio.create_task(post_stream_kick_task(member, after.channel.id))
-            post_stream_checks[member.id] = {"reminder": reminder, "kick": kick}
+    # pending deadlines keep the timeouts they were scheduled with
+    cfg = enforcement_config.update(interaction.guild.id, **changes)
+    await interaction.response.send_message(embed=make_vcconfig_embed(interaction.guild, cfg), ephemeral=True)
+
+
+@tree.command(name="vcconfig_exempt", description="Exempt a role from voice enforcement (or remove the exemption)")
+@app_commands.describe(role="The role", exempt="True to exempt, False to enforce again")
+async def vcconfig_exempt(interaction: discord.Interaction, role: discord.Role, exempt: bool):
+    if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
+        return await interaction.response.send_message("You cannot use this command.", ephemeral=True)
+
+    cfg = enforcement_config.for_guild(interaction.guild.id)
+    exempt_roles = cfg.exempt_roles | {role.id} if exempt else cfg.exempt_roles - {role.id}
+    cfg = enforcement_config.update(interaction.guild.id, exempt_roles=exempt_roles)
+    if exempt:
+        # members with the role are off the clock now
+        for member in role.members:
+            enforcement.cancel(member.id)
+    await interaction.response.send_message(embed=make_vcconfig_embed(interaction.guild, cfg), ephemeral=True)
 
 
 # =====================================================
@@ -621,7 +1974,8 @@ async def remindjournal(interaction: discord.Interaction, enable: bool, journal_
             "last_reminder_sent": None
         }
         
-        save_journal_data(journal_data)
+        save_journal_data(user_id)
+        journal_posts.refresh_watched(journal_data)
         
         await interaction.response.send_message(
             f"✅ Journal reminders enabled!\n\n"
@@ -631,11 +1985,15 @@ async def remindjournal(interaction: discord.Interaction, enable: bool, journal_
             f"in the last 24 hours.",
             ephemeral=True
         )
+
+        # Pick up what was posted before the thread was watched
+        await backfill_journal_thread(thread_id)
     else:
         # Disable reminders
         if user_id in journal_data:
             journal_data[user_id]["enabled"] = False
-            save_journal_data(journal_data)
+            save_journal_data(user_id)
+            journal_posts.refresh_watched(journal_data)
         
         await interaction.response.send_message(
             "❌ Journal reminders disabled.",
@@ -701,33 +2059,14 @@ async def journalstatus(interaction: discord.Interaction):
     
     # Check if they've posted in the last 24 hours
     if thread_id and data.get("enabled"):
-        try:
-            thread = bot.get_channel(int(thread_id))
-            if not thread:
-                thread = await bot.fetch_channel(int(thread_id))
-            
-            if thread and isinstance(thread, discord.Thread):
-                twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
-                has_posted = False
-                
-                async for message in thread.history(limit=200, after=twenty_four_hours_ago):
-                    if message.author.id == interaction.user.id:
-                        has_posted = True
-                        embed.add_field(
-                            name="Recent Activity",
-                            value=f"✅ You posted <t:{int(message.created_at.timestamp())}:R>",
-                            inline=False
-                        )
-                        break
-                
-                if not has_posted:
-                    embed.add_field(
-                        name="Recent Activity",
-                        value="❌ No posts in the last 24 hours",
-                        inline=False
-                    )
-        except:
-            pass
+        if not await backfill_journal_thread(int(thread_id)):
+            activity = "⚠️ Couldn't read your journal thread right now"
+        elif journal_posts.posted_recently(thread_id, interaction.user.id, time_module.time()):
+            posted_at = journal_posts.last_post_time(thread_id, interaction.user.id)
+            activity = f"✅ You posted <t:{int(posted_at)}:R>"
+        else:
+            activity = "❌ No posts in the last 24 hours"
+        embed.add_field(name="Recent Activity", value=activity, inline=False)
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -739,7 +2078,6 @@ async def journalstatus(interaction: discord.Interaction):
 @tree.command(name="laststand_start", description="Start a new Last Stand game")
 @app_commands.describe(starting_lives="Number of lives each player starts with (default: 3)")
 async def laststand_start(interaction: discord.Interaction, starting_lives: int = 3):
-    global last_stand_data
     
     # Check permission
     if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
@@ -748,13 +2086,7 @@ async def laststand_start(interaction: discord.Interaction, starting_lives: int
     if last_stand_data["active"]:
         return await interaction.response.send_message("A game is already active! End it first with `/laststand_end`", ephemeral=True)
     
-    last_stand_data = {
-        "active": True,
-        "players": {},
-        "starting_lives": starting_lives,
-        "pom_logs": []
-    }
-    save_last_stand(last_stand_data)
+    record_last_stand({"type": "start", "starting_lives": starting_lives})
     
     embed = discord.Embed(
         title="🎯 LAST STAND - Game Started!",
@@ -780,7 +2112,6 @@ async def laststand_start(interaction: discord.Interaction, starting_lives: int
 
 @tree.command(name="laststand_join", description="Join the active Last Stand game")
 async def laststand_join(interaction: discord.Interaction):
-    global last_stand_data
     
     if not last_stand_data["active"]:
         return await interaction.response.send_message("No active game! Start one with `/laststand_start`", ephemeral=True)
@@ -790,13 +2121,11 @@ async def laststand_join(interaction: discord.Interaction):
     if user_id in last_stand_data["players"]:
         return await interaction.response.send_message("You're already in the game!", ephemeral=True)
     
-    last_stand_data["players"][user_id] = {
-        "name": interaction.user.display_name,
-        "lives": last_stand_data["starting_lives"],
-        "defense_poms": 0,
-        "eliminated": False
-    }
-    save_last_stand(last_stand_data)
+    record_last_stand({
+        "type": "join",
+        "user_id": user_id,
+        "name": interaction.user.display_name
+    })
     
     await interaction.response.send_message(
         f"✅ {interaction.user.mention} joined the game with **{last_stand_data['starting_lives']} lives**!",
@@ -807,7 +2136,6 @@ async def laststand_join(interaction: discord.Interaction):
 @tree.command(name="laststand_defend", description="Log defensive poms to block attacks")
 @app_commands.describe(poms="Number of poms to add to your defense")
 async def laststand_defend(interaction: discord.Interaction, poms: int):
-    global last_stand_data
     
     if not last_stand_data["active"]:
         return await interaction.response.send_message("No active game!", ephemeral=True)
@@ -825,9 +2153,7 @@ async def laststand_defend(interaction: discord.Interaction, poms: int):
     if poms <= 0:
         return await interaction.response.send_message("Poms must be positive!", ephemeral=True)
     
-    player["defense_poms"] += poms
-    
-    last_stand_data["pom_logs"].append({
+    record_last_stand({
         "type": "defend",
         "user_id": user_id,
         "user_name": interaction.user.display_name,
@@ -835,8 +2161,6 @@ async def laststand_defend(interaction: discord.Interaction, poms: int):
         "timestamp": datetime.utcnow().isoformat()
     })
     
-    save_last_stand(last_stand_data)
-    
     await interaction.response.send_message(
         f"🛡️ {interaction.user.mention} added **{poms} defensive poms**! Total defense: **{player['defense_poms']}**",
         ephemeral=False
@@ -849,7 +2173,6 @@ async def laststand_defend(interaction: discord.Interaction, poms: int):
     poms="Number of poms to use in the attack"
 )
 async def laststand_attack(interaction: discord.Interaction, target: discord.Member, poms: int):
-    global last_stand_data
     
     if not last_stand_data["active"]:
         return await interaction.response.send_message("No active game!", ephemeral=True)
@@ -884,19 +2207,12 @@ async def laststand_attack(interaction: discord.Interaction, target: discord.Mem
     
     if target_player["defense_poms"] > 0:
         blocked_poms = min(remaining_poms, target_player["defense_poms"])
-        target_player["defense_poms"] -= blocked_poms
         remaining_poms -= blocked_poms
     
-    # Apply damage
+    # Damage and elimination are applied by the event
     damage = remaining_poms
-    target_player["lives"] -= damage
-    
-    # Check if eliminated
-    if target_player["lives"] <= 0:
-        target_player["lives"] = 0
-        target_player["eliminated"] = True
     
-    last_stand_data["pom_logs"].append({
+    record_last_stand({
         "type": "attack",
         "attacker_id": attacker_id,
         "attacker_name": interaction.user.display_name,
@@ -908,8 +2224,6 @@ async def laststand_attack(interaction: discord.Interaction, target: discord.Mem
         "timestamp": datetime.utcnow().isoformat()
     })
     
-    save_last_stand(last_stand_data)
-    
     # Create response
     response = f"⚔️ {interaction.user.mention} attacked {target.mention} with **{poms} poms**!\n\n"
     
@@ -936,7 +2250,6 @@ async def laststand_attack(interaction: discord.Interaction, target: discord.Mem
 
 @tree.command(name="laststand_status", description="View the current game status")
 async def laststand_status(interaction: discord.Interaction):
-    global last_stand_data
     
     if not last_stand_data["active"]:
         return await interaction.response.send_message("No active game!", ephemeral=True)
@@ -981,7 +2294,6 @@ async def laststand_status(interaction: discord.Interaction):
 
 @tree.command(name="laststand_end", description="End the current Last Stand game")
 async def laststand_end(interaction: discord.Interaction):
-    global last_stand_data
     
     # Check permission
     if not any(role.id in ALLOWED_ROLES for role in interaction.user.roles):
@@ -1004,13 +2316,7 @@ async def laststand_end(interaction: discord.Interaction):
     else:
         embed.description = "Game ended with multiple survivors or no clear winner."
     
-    last_stand_data = {
-        "active": False,
-        "players": {},
-        "starting_lives": 3,
-        "pom_logs": []
-    }
-    save_last_stand(last_stand_data)
+    record_last_stand({"type": "end"})
     
     await interaction.response.send_message(embed=embed)
 
@@ -1065,7 +2371,10 @@ async def addpoints(interaction: discord.Interaction, user: discord.Member, poin
     team_name = calculate_team(user.id)  # You already have this logic earlier
 
     # Load current points
-    pts = await get_team_points()
+    try:
+        pts = await get_team_points()
+    except Exception as e:
+        return await interaction.response.send_message(f"❌ Team points are unavailable right now: {e}", ephemeral=True)
 
     if team_name == "X":
         pts["X"] += points
@@ -1083,7 +2392,10 @@ async def addpoints(interaction: discord.Interaction, user: discord.Member, poin
 
 @tree.command(name="viewteampoints", description="View current X/Y team scores.")
 async def viewteampoints(interaction: discord.Interaction):
-    pts = await get_team_points()
+    try:
+        pts = await get_team_points()
+    except Exception as e:
+        return await interaction.response.send_message(f"❌ Team points are unavailable right now: {e}", ephemeral=True)
 
     embed = discord.Embed(
         title="Team Scores",
@@ -1251,283 +2563,97 @@ async def reminder(
             print("[REMINDER] Error: channel not found.")
             return
 
-        msg = (
-            "@everyone\n"
-            "**🔔 EVENT REMINDER**\n"
-            f"{reminder_about} will start in **10 minutes**, hop in on <#{EVENT_VC_ID}>.\n\n"
-            f"Event time: <t:{timestamp}:F>"
-        )
-
-        try:
-            await channel.send(msg)
-            print(f"[REMINDER] Sent reminder for timestamp {timestamp}")
-        except Exception as e:
-            print(f"[REMINDER ERROR] {e}")
-
-    asyncio.create_task(reminder_task())
-    
-# =====================================================
-#                   RENDER WEB SERVER
-# =====================================================
-
-from aiohttp import web
-
-async def start_webserver():
-    app = web.Application()
-    app.add_routes([web.get("/", lambda r: web.Response(text="Bot Alive"))])
-    runner = web.AppRunner(app)
-    await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", 10000)
-    await site.start()
-    print("Heartbeat running")
-
-# ------------------- GITHUB PERSISTENCE LAYER -----------------------
-
-GH_TOKEN = os.getenv("GH_TOKEN")
-GH_OWNER = os.getenv("GH_REPO_OWNER")
-GH_REPO = os.getenv("GH_REPO_NAME")
-GH_FILE = os.getenv("GH_POINTS_FILE_PATH")
-
-GH_API_BASE = f"https://api.github.com/repos/{GH_OWNER}/{GH_REPO}/contents/{GH_FILE}"
-
-# store SHA so updates work correctly
-points_file_sha = None  
-
-
-async def github_get_points():
-    """Load points.json from GitHub or create it if missing."""
-    global points_file_sha
-
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(GH_API_BASE, headers=headers) as r:
-            if r.status == 200:
-                data = await r.json()
-                points_file_sha = data["sha"]  # required for updating files later
-
-                content = base64.b64decode(data["content"]).decode()
-                try:
-                    points = json.loads(content)
-                    return points
-                except:
-                    return {"X": 0, "Y": 0}
-
-            else:
-                # File does not exist → create default one
-                print("[GITHUB] points.json missing → creating new one...")
-                await github_update_points({"X": 0, "Y": 0})
-                return {"X": 0, "Y": 0}
-
-
-async def github_update_points(points_dict):
-    """Save updated points.json to GitHub."""
-    global points_file_sha
-
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
-
-    content_bytes = json.dumps(points_dict, indent=4).encode()
-    encoded = base64.b64encode(content_bytes).decode()
-
-    payload = {
-        "message": "update team points",
-        "content": encoded,
-        "sha": points_file_sha
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.put(GH_API_BASE, headers=headers, json=payload) as r:
-            if r.status in [200, 201]:
-                resp = await r.json()
-                points_file_sha = resp["content"]["sha"]
-                print("[GITHUB] Points updated successfully.")
-            else:
-                print("[GITHUB] Failed to update points:", r.status)
-                print(await r.text())
-
-async def get_team_points():
-    """Loads the X/Y team scores from GitHub."""
-    return await github_get_points()
-
-
-async def set_team_points(x_points, y_points):
-    """Writes the new values back to GitHub."""
-    await github_update_points({"X": x_points, "Y": y_points})
-
-# ================= CODEFORCES CHANNEL UPDATER =================
-
-import aiohttp
-import base64
-import json
-import os
-import discord
-from discord.ext import tasks
-from discord import app_commands
-
-# ---------- CONFIG ----------
-CODEFORCES_API = "https://codeforces.com/api/contest.list"
-
-GH_CF_FILE = os.getenv("GH_CF_FILE_PATH")
-GH_OWNER = os.getenv("GH_REPO_OWNER")
-GH_REPO = os.getenv("GH_REPO_NAME")
-GH_TOKEN = os.getenv("GH_TOKEN")
-GH_LC_FILE = os.getenv("GH_LC_FILE_PATH")
-GH_LC_API = f"https://api.github.com/repos/{GH_OWNER}/{GH_REPO}/contents/{GH_LC_FILE}"
-
-GH_CF_API = f"https://api.github.com/repos/{GH_OWNER}/{GH_REPO}/contents/{GH_CF_FILE}"
-
-cf_file_sha = None
-
-
-# ---------- GITHUB STORAGE ----------
-async def github_get_cf_data():
-    global cf_file_sha
-
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
-
-    async with aiohttp.ClientSession() as session:
-        async with session.get(GH_CF_API, headers=headers) as r:
-            text = await r.text()
-
-            # ---------- FILE EXISTS ----------
-            if r.status == 200:
-                try:
-                    data = json.loads(text)
-                except json.JSONDecodeError:
-                    raise RuntimeError(
-                        f"GitHub returned invalid JSON (200):\n{text}"
-                    )
-
-                cf_file_sha = data["sha"]
-
-                try:
-                    content = base64.b64decode(data["content"]).decode()
-                    return json.loads(content)
-                except Exception:
-                    # file exists but is empty/corrupt → reset safely
-                    default = {
-                        "channels": [],
-                        "last_contest_id": None
-                    }
-                    await github_set_cf_data(default)
-                    return default
-
-            # ---------- FILE DOES NOT EXIST ----------
-            if r.status == 404:
-                default = {
-                    "channels": [],
-                    "last_contest_id": None
-                }
-                await github_set_cf_data(default)
-                return default
-
-            # ---------- ANY OTHER RESPONSE ----------
-            raise RuntimeError(
-                f"GitHub GET failed ({r.status})\n{text}"
-            )
-
-async def github_set_cf_data(data_dict):
-    global cf_file_sha
-
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
-
-    encoded = base64.b64encode(
-        json.dumps(data_dict, indent=4).encode()
-    ).decode()
-
-    payload = {
-        "message": "update codeforces state",
-        "content": encoded
-    }
-
-    if cf_file_sha:
-        payload["sha"] = cf_file_sha
-
-    async with aiohttp.ClientSession() as session:
-        async with session.put(GH_CF_API, headers=headers, json=payload) as r:
-
-            if r.status not in (200, 201):
-                text = await r.text()
-                raise RuntimeError(
-                    f"GitHub PUT failed ({r.status})\n{text}"
-                )
+        msg = (
+            "@everyone\n"
+            "**🔔 EVENT REMINDER**\n"
+            f"{reminder_about} will start in **10 minutes**, hop in on <#{EVENT_VC_ID}>.\n\n"
+            f"Event time: <t:{timestamp}:F>"
+        )
 
-            resp = await r.json()
-            cf_file_sha = resp["content"]["sha"]
+        try:
+            await channel.send(msg)
+            print(f"[REMINDER] Sent reminder for timestamp {timestamp}")
+        except Exception as e:
+            print(f"[REMINDER ERROR] {e}")
 
-# ================= LEETCODE STORAGE =================
+    asyncio.create_task(reminder_task())
+    
+# =====================================================
+#                   RENDER WEB SERVER
+# =====================================================
 
-lc_file_sha = None
+from aiohttp import web
 
+async def start_webserver():
+    app = web.Application()
+    app.add_routes([
+        web.get("/", lambda r: web.Response(text="Bot Alive")),
+        web.get("/enforcement", lambda r: web.json_response({
+            "pending": dict(enforcement.counts),
+            "queued": action_queue.depth(),
+            "sent": dict(action_queue.sent),
+            "dropped": dict(action_queue.dropped)
+        })),
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", 10000)
+    await site.start()
+    print("Heartbeat running")
 
-async def github_get_lc_data():
-    global lc_file_sha
+# ------------------- TEAM POINTS STORAGE -----------------------
 
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
+async def get_team_points():
+    """Loads the X/Y team scores from the local state backend."""
+    await replicator.ensure_seeded("points")
+    return {
+        "X": state.get("points", "X", 0),
+        "Y": state.get("points", "Y", 0)
     }
 
-    async with aiohttp.ClientSession() as session:
-        async with session.get(GH_LC_API, headers=headers) as r:
-            text = await r.text()
 
-            if r.status == 200:
-                data = json.loads(text)
-                lc_file_sha = data["sha"]
-                content = base64.b64decode(data["content"]).decode()
-                return json.loads(content)
+async def set_team_points(x_points, y_points):
+    """Writes the new values back (replicated to GitHub in the background)."""
+    await replicator.ensure_seeded("points")
+    state.save("points", {"X": x_points, "Y": y_points})
 
-            if r.status == 404:
-                default = {
-                    "channels": [],
-                    "last_question_slug": None
-                }
-                await github_set_lc_data(default)
-                return default
+# ================= CODEFORCES CHANNEL UPDATER =================
 
-            raise RuntimeError(f"GitHub LC GET failed ({r.status})\n{text}")
+import aiohttp
+import base64
+import json
+import os
+import discord
+from discord.ext import tasks
+from discord import app_commands
 
+# ---------- CONFIG ----------
+CODEFORCES_API = "https://codeforces.com/api/contest.list"
 
-async def github_set_lc_data(data_dict):
-    global lc_file_sha
 
-    headers = {
-        "Authorization": f"Bearer {GH_TOKEN}",
-        "Accept": "application/vnd.github+json"
-    }
+# ---------- STATE STORAGE ----------
+async def load_cf_data():
+    await replicator.ensure_seeded("codeforces")
+    return state.load("codeforces", {
+        "channels": [],
+        "last_contest_id": None
+    })
 
-    encoded = base64.b64encode(
-        json.dumps(data_dict, indent=4).encode()
-    ).decode()
+def save_cf_data(data_dict):
+    state.save("codeforces", data_dict)
 
-    payload = {
-        "message": "update leetcode state",
-        "content": encoded
-    }
+# ================= LEETCODE STORAGE =================
 
-    if lc_file_sha:
-        payload["sha"] = lc_file_sha
+async def load_lc_data():
+    await replicator.ensure_seeded("leetcode")
+    return state.load("leetcode", {
+        "channels": [],
+        "last_question_slug": None
+    })
 
-    async with aiohttp.ClientSession() as session:
-        async with session.put(GH_LC_API, headers=headers, json=payload) as r:
-            if r.status not in (200, 201):
-                raise RuntimeError(await r.text())
 
-            resp = await r.json()
-            lc_file_sha = resp["content"]["sha"]
+def save_lc_data(data_dict):
+    state.save("leetcode", data_dict)
 
 
 # ---------- HELPERS ----------
@@ -1570,8 +2696,8 @@ async def codeforces_watcher():
     cf_dbg("START", "Watcher tick started")
 
     try:
-        cf_data = await github_get_cf_data()
-        cf_dbg("STATE", f"Loaded GitHub state: {cf_data}")
+        cf_data = await load_cf_data()
+        cf_dbg("STATE", f"Loaded state: {cf_data}")
 
         contests = await fetch_contests()
         cf_dbg("FETCH", f"Fetched {len(contests)} contests")
@@ -1647,7 +2773,7 @@ async def codeforces_watcher():
 
         if posted:
             cf_data["last_contest_id"] = contest["id"]
-            await github_set_cf_data(cf_data)
+            save_cf_data(cf_data)
             cf_dbg("STATE", f"Updated last_contest_id -> {contest['id']}")
         else:
             cf_dbg("WARNING", "Nothing posted — state NOT updated")
@@ -1711,8 +2837,8 @@ async def leetcode_watcher():
     dbg("START", "Watcher tick started")
 
     try:
-        lc_data = await github_get_lc_data()
-        dbg("STATE", f"Loaded GitHub state: {lc_data}")
+        lc_data = await load_lc_data()
+        dbg("STATE", f"Loaded state: {lc_data}")
 
         daily = await fetch_leetcode_daily()
         dbg("FETCH", f"Fetched daily payload: {daily}")
@@ -1778,7 +2904,7 @@ async def leetcode_watcher():
 
         if posted:
             lc_data["last_question_slug"] = slug
-            await github_set_lc_data(lc_data)
+            save_lc_data(lc_data)
             dbg("STATE", f"Updated last_question_slug -> {slug}")
         else:
             dbg("WARNING", "Nothing posted — state NOT updated")
@@ -1810,11 +2936,11 @@ async def setup(
 
     try:
         if update_type.value == "codeforces":
-            cf_data = await github_get_cf_data()
+            cf_data = await load_cf_data()
 
             if channel.id not in cf_data["channels"]:
                 cf_data["channels"].append(channel.id)
-                await github_set_cf_data(cf_data)
+                save_cf_data(cf_data)
 
             if not codeforces_watcher.is_running():
                 codeforces_watcher.start()
@@ -1826,12 +2952,12 @@ async def setup(
         elif update_type.value == "leetcode":
             print("[SETUP:LC] Setup started")
         
-            lc_data = await github_get_lc_data()
+            lc_data = await load_lc_data()
             print("[SETUP:LC] Loaded state:", lc_data)
         
             if channel.id not in lc_data["channels"]:
                 lc_data["channels"].append(channel.id)
-                await github_set_lc_data(lc_data)
+                save_lc_data(lc_data)
                 print(f"[SETUP:LC] Added channel {channel.id}")
         
             if not leetcode_watcher.is_running():
@@ -1854,23 +2980,549 @@ async def setup(
 #              ACTIVITY TRACKING HELPERS
 # =====================================================
 
+ACTIVITY_SNAPSHOT_FILE = os.getenv("ACTIVITY_SNAPSHOT_PATH", "activity.snap")
+ACTIVITY_JSON_EXPORT_FILE = os.getenv("ACTIVITY_JSON_EXPORT_PATH", "activity_export.json")
+ACTIVITY_COMPACT_ROWS = 5000            # fold row deltas into the snapshot once this many pile up...
+ACTIVITY_COMPACT_SECONDS = 6 * 3600     # ...or at least this often
+RANK_INDEX_BLOCK = 512                  # keys per block of a RankIndex (blocks split at twice this)
+
+# Activity is persisted in two layers. Every save upserts only the rows that
+# changed since the previous save into the "activity" state table. Now and
+# then a compaction writes a full snapshot (plus the JSON debug export) from
+# a worker thread and deletes the table rows it covers. Loading reads the
+# snapshot and overlays the table rows on top.
+
+# Snapshot layout (little-endian), version 2:
+#   header   magic "VCAS", u16 version, u32 user count
+#   periods  u32 day, u32 week, u32 month the period counters belong to
+#   index    u64 user id per user, sorted ascending
+#   records  one fixed-width record per user, same order as the index:
+#            u32 voice_time, u32 stream_time, u32 video_time, u32 xp, u16 level, u8 flags,
+#            f64 coins, f64 last_activity_update, f64 vc_join_time,
+#            f64 stream_start_time, f64 video_start_time   (NaN = None)
+#            then for day, week, month:
+#            u32 voice_time, u32 stream_time, u32 video_time, u32 xp, f64 coins
+# Version 1 files (no periods section, no period counters) still load.
+ACTIVITY_SNAPSHOT_MAGIC = b"VCAS"
+ACTIVITY_SNAPSHOT_VERSION = 2
+_ACTIVITY_HEADER = struct.Struct("<4sHI")
+_ACTIVITY_PERIOD_IDS = struct.Struct("<III")
+_ACTIVITY_RECORDS = {
+    1: struct.Struct("<IIIIHBddddd"),
+    2: struct.Struct("<IIIIHBddddd" + "IIIId" * 3),
+}
+_ACTIVITY_FLAG_IN_VC = 1
+
+ACTIVITY_FIELDS = (
+    "voice_time", "stream_time", "video_time", "coins", "xp", "level",
+    "last_activity_update", "currently_in_vc", "vc_join_time",
+    "stream_start_time", "video_start_time"
+)
+ACTIVITY_INT_FIELDS = ("voice_time", "stream_time", "video_time", "xp", "level")
+ACTIVITY_TIME_FIELDS = ("last_activity_update", "vc_join_time", "stream_start_time", "video_start_time")
+ACTIVITY_RANKED_FIELDS = ("xp", "voice_time", "stream_time", "video_time", "coins")
+
+# Besides lifetime totals, each user has counters for the current calendar
+# day, week and month (UTC, weeks start Monday). They are credited alongside
+# the totals and cleared when their period ends, so period leaderboards read
+# a ready-made column instead of summing raw history.
+ACTIVITY_PERIODS = ("day", "week", "month")
+ACTIVITY_PERIOD_NAMES = {"day": "Today", "week": "This Week", "month": "This Month"}
+ACTIVITY_PERIOD_FIELDS = ("voice_time", "stream_time", "video_time", "xp", "coins")
+
+def period_field(field, period=None):
+    """Column holding `field` for `period` (the lifetime column when period is None)."""
+    return f"{field}_{period}" if period else field
+
+ACTIVITY_PERIOD_COLUMNS = tuple(
+    period_field(field, period) for period in ACTIVITY_PERIODS for field in ACTIVITY_PERIOD_FIELDS
+)
+
+def activity_period_ids(now):
+    day = int(now // 86400)
+    tm = time_module.gmtime(now)
+    return {
+        "day": day,
+        "week": (day + 3) // 7,  # 1970-01-01 was a Thursday
+        "month": tm.tm_year * 12 + tm.tm_mon - 1
+    }
+
+_activity_compacted_at = 0.0
+_activity_compaction = None                  # running compaction task
+_activity_flushed_during_compaction = None   # user ids saved while a compaction runs
+
+class ActivityRow:
+    """Dict-style view of one user's row in an ActivityStore."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    def __getitem__(self, field):
+        value = self.store.columns[field][self.row]
+        if field in ACTIVITY_TIME_FIELDS:
+            return None if math.isnan(value) else value
+        if field == "currently_in_vc":
+            return bool(value)
+        return value
+
+    def __setitem__(self, field, value):
+        if field in ACTIVITY_TIME_FIELDS and value is None:
+            value = math.nan
+        self.store.set(self.row, field, value)
+
+    def to_dict(self):
+        data = {field: self[field] for field in ACTIVITY_FIELDS + ACTIVITY_PERIOD_COLUMNS}
+        data["periods"] = dict(self.store.period_ids)
+        return data
+
+
+class RankIndex:
+    """
+    Rows of one column ordered highest score first (ties by row number),
+    kept sorted as scores change so ranks and pages never need a full sort.
+
+    Keys live in a list of short sorted blocks (a sqrt-decomposed sorted
+    list): moving a row bisects the block maxima and shifts one block of at
+    most 2 * RANK_INDEX_BLOCK keys instead of the whole ranking.
+    """
+
+    def __init__(self, column):
+        keys = sorted((-score, row) for row, score in enumerate(column))
+        self.blocks = [keys[i:i + RANK_INDEX_BLOCK] for i in range(0, len(keys), RANK_INDEX_BLOCK)]
+        self.maxes = [block[-1] for block in self.blocks]
+        self.size = len(keys)
+        self._offsets = None  # keys before each block, rebuilt on demand
+
+    def __len__(self):
+        return self.size
+
+    def _add(self, key):
+        self._offsets = None
+        self.size += 1
+        if not self.blocks:
+            self.blocks.append([key])
+            self.maxes.append(key)
+            return
+
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.maxes):
+            i -= 1
+            self.blocks[i].append(key)
+            self.maxes[i] = key
+        else:
+            bisect.insort(self.blocks[i], key)
+
+        block = self.blocks[i]
+        if len(block) > 2 * RANK_INDEX_BLOCK:
+            self.blocks[i:i + 1] = [block[:RANK_INDEX_BLOCK], block[RANK_INDEX_BLOCK:]]
+            self.maxes[i:i + 1] = [block[RANK_INDEX_BLOCK - 1], block[-1]]
+
+    def _discard(self, key):
+        i = bisect.bisect_left(self.maxes, key)
+        block = self.blocks[i]
+        del block[bisect.bisect_left(block, key)]
+        self._offsets = None
+        self.size -= 1
+        if block:
+            self.maxes[i] = block[-1]
+        else:
+            del self.blocks[i]
+            del self.maxes[i]
+
+    def _block_offsets(self):
+        if self._offsets is None:
+            offsets = [0]
+            for block in self.blocks:
+                offsets.append(offsets[-1] + len(block))
+            self._offsets = offsets
+        return self._offsets
+
+    def insert(self, row, score):
+        self._add((-score, row))
+
+    def move(self, row, old, new):
+        if old == new:
+            return
+        self._discard((-old, row))
+        self._add((-new, row))
+
+    def rank(self, row, score):
+        """1-based position of `row`, which currently has `score`."""
+        key = (-score, row)
+        i = bisect.bisect_left(self.maxes, key)
+        if i == len(self.blocks):
+            return self.size + 1
+        return self._block_offsets()[i] + bisect.bisect_left(self.blocks[i], key) + 1
+
+    def rows(self, start=0, stop=None):
+        stop = self.size if stop is None else min(stop, self.size)
+        if start >= stop:
+            return []
+
+        offsets = self._block_offsets()
+        i = bisect.bisect_right(offsets, start) - 1
+        skip = start - offsets[i]
+        rows = []
+        while len(rows) < stop - start:
+            rows.extend(row for _, row in self.blocks[i][skip:skip + stop - start - len(rows)])
+            i += 1
+            skip = 0
+        return rows
+
+
+class ActivityStore:
+    """
+    Activity for every user, stored column-wise: one typed array per field
+    plus a user id -> row index. Timestamps use NaN for "not set".
+
+    Settling and sorting walk flat arrays instead of a dict per user, and a
+    row costs about 90 bytes instead of a dict of eleven boxed values.
+    """
+
+    def __init__(self):
+        self.rows = {}  # user id (str) -> row number
+        self.ranks = {}  # field -> RankIndex, built on first use
+        self.dirty = set()  # rows changed since the last save
+        self.ids = array("Q")
+        self.columns = {field: array("q") for field in ACTIVITY_INT_FIELDS}
+        self.columns["coins"] = array("d")
+        self.columns["currently_in_vc"] = array("B")
+        for field in ACTIVITY_TIME_FIELDS:
+            self.columns[field] = array("d")
+        for period in ACTIVITY_PERIODS:
+            for field in ACTIVITY_PERIOD_FIELDS:
+                self.columns[period_field(field, period)] = array(self.columns[field].typecode)
+        self.period_ids = activity_period_ids(time_module.time())
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, user_id):
+        return user_id in self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __getitem__(self, user_id):
+        return ActivityRow(self, self.rows[user_id])
+
+    def items(self):
+        for user_id, row in self.rows.items():
+            yield user_id, ActivityRow(self, row)
+
+    def ensure(self, user_id: str):
+        """Row number for `user_id`, appending a fresh row if needed."""
+        row = self.rows.get(user_id)
+        if row is not None:
+            return row
+
+        row = len(self.ids)
+        self.ids.append(int(user_id))
+        for field in ACTIVITY_INT_FIELDS:
+            self.columns[field].append(1 if field == "level" else 0)
+        self.columns["coins"].append(0.0)
+        self.columns["currently_in_vc"].append(0)
+        for field in ACTIVITY_TIME_FIELDS:
+            self.columns[field].append(math.nan)
+        for name in ACTIVITY_PERIOD_COLUMNS:
+            self.columns[name].append(0)
+        self.rows[user_id] = row
+        self.dirty.add(row)
+        for field, index in self.ranks.items():
+            index.insert(row, self.columns[field][row])
+        return row
+
+    def set(self, row, field, value):
+        column = self.columns[field]
+        old = column[row]
+        column[row] = value
+        self.dirty.add(row)
+        index = self.ranks.get(field)
+        if index:
+            index.move(row, old, column[row])
+
+    def rank_index(self, field):
+        if field not in self.ranks:
+            self.ranks[field] = RankIndex(self.columns[field])
+        return self.ranks[field]
+
+    def rank(self, field, user_id):
+        """1-based rank of `user_id` by `field`, highest first."""
+        row = self.rows[user_id]
+        return self.rank_index(field).rank(row, self.columns[field][row])
+
+    def ranked(self, field, start=0, stop=None):
+        """User ids ordered by `field`, highest first, sliced to [start:stop]."""
+        return [str(self.ids[row]) for row in self.rank_index(field).rows(start, stop)]
+
+    def _start_period(self, period, period_id):
+        self.period_ids[period] = period_id
+        for field in ACTIVITY_PERIOD_FIELDS:
+            name = period_field(field, period)
+            column = self.columns[name]
+            self.columns[name] = array(column.typecode, bytes(len(column) * column.itemsize))
+            self.ranks.pop(name, None)
+
+    def roll_periods(self, now):
+        """Clear the counters of any day, week or month that has ended."""
+        for period, period_id in activity_period_ids(now).items():
+            if period_id != self.period_ids.get(period):
+                self._start_period(period, period_id)
+
+    def settle(self, rows, now):
+        """Credit the time since the last settle to each open session in `rows`."""
+        self.roll_periods(now)
+        self.dirty.update(rows)
+        c = self.columns
+        voice, stream, video = c["voice_time"], c["stream_time"], c["video_time"]
+        xp, level, coins = c["xp"], c["level"], c["coins"]
+        last_update, in_vc = c["last_activity_update"], c["currently_in_vc"]
+        stream_start, video_start = c["stream_start_time"], c["video_start_time"]
+        tracked = [(c[field], index) for field, index in self.ranks.items()]
+        periods = {
+            field: [c[period_field(field, period)] for period in ACTIVITY_PERIODS]
+            for field in ACTIVITY_PERIOD_FIELDS
+        }
+
+        for row in rows:
+            last = last_update[row]
+            if not in_vc[row] or math.isnan(last):
+                last_update[row] = now
+                continue
+
+            elapsed = int(now - last)
+            if elapsed <= 0:
+                continue
+            # keep the sub-second remainder for the next settle
+            last_update[row] = last + elapsed
+            before = [column[row] for column, _ in tracked]
+
+            # XP for every minute boundary crossed
+            xp_gain = (voice[row] + elapsed) // 60 - voice[row] // 60  # 1 XP per minute in VC
+            voice[row] += elapsed
+            gained = {"voice_time": elapsed}
+            if not math.isnan(stream_start[row]):
+                xp_gain += ((stream[row] + elapsed) // 60 - stream[row] // 60) * 2  # Bonus XP for streaming
+                stream[row] += elapsed
+                gained["stream_time"] = elapsed
+            if not math.isnan(video_start[row]):
+                xp_gain += (video[row] + elapsed) // 60 - video[row] // 60  # Bonus XP for video
+                video[row] += elapsed
+                gained["video_time"] = elapsed
+            xp[row] += xp_gain
+            gained["xp"] = xp_gain
+
+            # Update level
+            new_level = calculate_level(xp[row])
+            if new_level > level[row]:
+                level[row] = new_level
+
+            # Award coins based on level
+            gained["coins"] = calculate_coin_rate(level[row]) * elapsed / 60
+            coins[row] += gained["coins"]
+
+            for field, amount in gained.items():
+                for column in periods[field]:
+                    column[row] += amount
+
+            for (column, index), old in zip(tracked, before):
+                index.move(row, old, column[row])
+
+    def take_dirty(self):
+        """Rows changed since the last call, as {user id: row dict}."""
+        rows = {str(self.ids[row]): ActivityRow(self, row).to_dict() for row in self.dirty}
+        self.dirty.clear()
+        return rows
+
+    def copy(self):
+        """Detached copy of the data (no rank indexes), safe to encode off the event loop."""
+        store = ActivityStore()
+        store.rows = dict(self.rows)
+        store.ids = array(self.ids.typecode, self.ids)
+        store.columns = {name: array(column.typecode, column) for name, column in self.columns.items()}
+        store.period_ids = dict(self.period_ids)
+        return store
+
+    def load_rows(self, data: dict):
+        """Overlay row dicts (as produced by ActivityRow.to_dict) on the store."""
+        for user_id, values in data.items():
+            periods = values.get("periods", {})
+            for period, period_id in periods.items():
+                if period_id > self.period_ids[period]:
+                    self._start_period(period, period_id)
+
+            row = ActivityRow(self, self.ensure(user_id))
+            for field in ACTIVITY_FIELDS:
+                if field in values:
+                    row[field] = values[field]
+            # counters from an older period than the store's have already ended
+            for period, period_id in periods.items():
+                if period_id == self.period_ids[period]:
+                    for field in ACTIVITY_PERIOD_FIELDS:
+                        name = period_field(field, period)
+                        row[name] = values[name]
+
+    def to_dict(self):
+        return {user_id: row.to_dict() for user_id, row in self.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        store = cls()
+        store.load_rows(data)
+        store.dirty.clear()
+        return store
+
+def _write_atomic(path, payload: bytes):
+    """Write to a temp file, fsync it, then rename over `path`."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+def encode_activity_snapshot(store: ActivityStore) -> bytes:
+    order = sorted(range(len(store.ids)), key=store.ids.__getitem__)
+    c = store.columns
+    period_columns = [c[name] for name in ACTIVITY_PERIOD_COLUMNS]
+    record = _ACTIVITY_RECORDS[ACTIVITY_SNAPSHOT_VERSION]
+    parts = [
+        _ACTIVITY_HEADER.pack(ACTIVITY_SNAPSHOT_MAGIC, ACTIVITY_SNAPSHOT_VERSION, len(order)),
+        _ACTIVITY_PERIOD_IDS.pack(*(store.period_ids[period] for period in ACTIVITY_PERIODS)),
+        struct.pack(f"<{len(order)}Q", *(store.ids[row] for row in order))
+    ]
+    for row in order:
+        parts.append(record.pack(
+            c["voice_time"][row],
+            c["stream_time"][row],
+            c["video_time"][row],
+            c["xp"][row],
+            c["level"][row],
+            _ACTIVITY_FLAG_IN_VC if c["currently_in_vc"][row] else 0,
+            c["coins"][row],
+            c["last_activity_update"][row],
+            c["vc_join_time"][row],
+            c["stream_start_time"][row],
+            c["video_start_time"][row],
+            *(column[row] for column in period_columns)
+        ))
+    return b"".join(parts)
+
+def decode_activity_snapshot(blob: bytes) -> ActivityStore:
+    magic, version, count = _ACTIVITY_HEADER.unpack_from(blob)
+    if magic != ACTIVITY_SNAPSHOT_MAGIC or version not in _ACTIVITY_RECORDS:
+        raise ValueError(f"Unsupported activity snapshot ({magic!r}, v{version})")
+
+    store = ActivityStore()
+    offset = _ACTIVITY_HEADER.size
+    if version >= 2:
+        store.period_ids = dict(zip(ACTIVITY_PERIODS, _ACTIVITY_PERIOD_IDS.unpack_from(blob, offset)))
+        offset += _ACTIVITY_PERIOD_IDS.size
+
+    ids = struct.unpack_from(f"<{count}Q", blob, offset)
+    start = offset + 8 * count
+    record = _ACTIVITY_RECORDS[version]
+    records = record.iter_unpack(blob[start:start + count * record.size])
+
+    store.ids.extend(ids)
+    store.rows = {str(user_id): row for row, user_id in enumerate(ids)}
+    c = store.columns
+    period_columns = [c[name] for name in ACTIVITY_PERIOD_COLUMNS]
+    for voice, stream, video, xp, level, flags, coins, last_update, join, stream_start, video_start, *periods in records:
+        c["voice_time"].append(voice)
+        c["stream_time"].append(stream)
+        c["video_time"].append(video)
+        c["xp"].append(xp)
+        c["level"].append(level)
+        c["currently_in_vc"].append(flags & _ACTIVITY_FLAG_IN_VC)
+        c["coins"].append(coins)
+        c["last_activity_update"].append(last_update)
+        c["vc_join_time"].append(join)
+        c["stream_start_time"].append(stream_start)
+        c["video_start_time"].append(video_start)
+        for column, value in zip(period_columns, periods):
+            column.append(value)
+
+    if version < 2:
+        for column in period_columns:
+            column.frombytes(bytes(count * column.itemsize))
+    return store
+
+def load_activity_data():
+    store = None
+    if os.path.exists(ACTIVITY_SNAPSHOT_FILE):
+        try:
+            with open(ACTIVITY_SNAPSHOT_FILE, "rb") as f:
+                store = decode_activity_snapshot(f.read())
+        except (OSError, ValueError, struct.error) as e:
+            print(f"[ACTIVITY] Snapshot unreadable, falling back to JSON export: {e}")
+
+    if store is None and os.path.exists(ACTIVITY_JSON_EXPORT_FILE):
+        try:
+            with open(ACTIVITY_JSON_EXPORT_FILE, "r") as f:
+                store = ActivityStore.from_dict(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"[ACTIVITY] JSON export unreadable: {e}")
+
+    # rows saved since the last compaction; rows without period ids predate
+    # snapshots and only matter when there is no snapshot to load
+    rows = state.load("activity")
+    if store is None:
+        store = ActivityStore()
+    else:
+        rows = {user_id: row for user_id, row in rows.items() if "periods" in row}
+    store.load_rows(rows)
+    store.dirty.clear()
+    return store
+
+def save_activity_data(data: ActivityStore):
+    """Write only the rows changed since the last save."""
+    rows = data.take_dirty()
+    if not rows:
+        return
+    state.update("activity", rows, notify=False)
+    if _activity_flushed_during_compaction is not None:
+        _activity_flushed_during_compaction.update(rows)
+
+def _write_activity_files(snapshot: ActivityStore):
+    _write_atomic(ACTIVITY_SNAPSHOT_FILE, encode_activity_snapshot(snapshot))
+    _write_atomic(ACTIVITY_JSON_EXPORT_FILE, json.dumps(snapshot.to_dict(), indent=4).encode())
+
+async def compact_activity_data(data: ActivityStore):
+    """Write a fresh snapshot from a worker thread, then drop the row deltas it covers."""
+    global _activity_compacted_at, _activity_flushed_during_compaction
+    save_activity_data(data)
+    snapshot = data.copy()
+    _activity_flushed_during_compaction = set()
+    try:
+        await asyncio.to_thread(_write_activity_files, snapshot)
+        # rows saved after the copy are newer than the snapshot and must stay
+        folded = set(state.keys("activity")) - _activity_flushed_during_compaction
+        state.delete_many("activity", folded, notify=False)
+        _activity_compacted_at = time_module.time()
+        print(f"[ACTIVITY] Compacted {len(folded)} row deltas into the snapshot")
+    except Exception as e:
+        print(f"[ACTIVITY] Compaction failed: {e}")
+    finally:
+        _activity_flushed_during_compaction = None
+
+def maybe_compact_activity_data(data: ActivityStore):
+    global _activity_compaction
+    if _activity_compaction and not _activity_compaction.done():
+        return
+    if (state.count("activity") < ACTIVITY_COMPACT_ROWS
+            and time_module.time() - _activity_compacted_at < ACTIVITY_COMPACT_SECONDS):
+        return
+    _activity_compaction = asyncio.create_task(compact_activity_data(data))
+
+activity_data = load_activity_data()
+
 def get_user_data(user_id: str):
     """Get or create user activity data"""
-    if user_id not in activity_data:
-        activity_data[user_id] = {
-            "voice_time": 0,
-            "stream_time": 0,
-            "video_time": 0,
-            "coins": 0.0,
-            "xp": 0,
-            "level": 1,
-            "last_activity_update": None,
-            "currently_in_vc": False,
-            "vc_join_time": None,
-            "stream_start_time": None,
-            "video_start_time": None
-        }
-    return activity_data[user_id]
+    return ActivityRow(activity_data, activity_data.ensure(user_id))
 
 def calculate_level(xp: int):
     """Linear progression: 100 XP per level"""
@@ -1900,81 +3552,291 @@ def format_time(seconds: int):
 #              ACTIVITY TRACKING BACKGROUND TASK
 # =====================================================
 
+ACTIVITY_RECONCILE_CREDIT_SECONDS = 120   # longest session gap still credited after a restart/reconnect
+
+# Voice, stream and video time are credited from voice state transitions:
+# each open session remembers when it was last settled, and settling credits
+# the time since then to whatever the member was doing. The minute tick only
+# settles the sessions that are currently open.
+
+def settle_activity(user_data, now):
+    """Credit the time since the last settle to the user's open session."""
+    user_data.store.settle((user_data.row,), now)
+
+def open_voice_session(user_id: str, voice, now):
+    """Start (or update the stream/video flags of) a session for a member in voice."""
+    user_data = get_user_data(user_id)
+    settle_activity(user_data, now)
+
+    if not user_data["currently_in_vc"]:
+        user_data["currently_in_vc"] = True
+        user_data["vc_join_time"] = now
+        user_data["last_activity_update"] = now
+
+    if voice.self_stream:
+        if user_data["stream_start_time"] is None:
+            user_data["stream_start_time"] = now
+    else:
+        user_data["stream_start_time"] = None
+
+    if voice.self_video:
+        if user_data["video_start_time"] is None:
+            user_data["video_start_time"] = now
+    else:
+        user_data["video_start_time"] = None
+
+def close_voice_session(user_id: str, now):
+    user_data = get_user_data(user_id)
+    settle_activity(user_data, now)
+
+    user_data["currently_in_vc"] = False
+    user_data["vc_join_time"] = None
+    user_data["stream_start_time"] = None
+    user_data["video_start_time"] = None
+
+def track_voice_activity(member, before, after):
+    """Apply one voice state transition to the member's activity session."""
+    if member.bot:
+        return
+
+    now = time_module.time()
+    if after.channel:
+        open_voice_session(str(member.id), after, now)
+    elif before.channel:
+        close_voice_session(str(member.id), now)
+
+def reconcile_voice_sessions(reason: str):
+    """
+    Line persisted sessions up with the live voice states after a restart or
+    gateway reconnect: one sweep over the voice channels (re-seeding the
+    index) and one over the sessions stored as open. Sessions that ended
+    while we were away are closed, new ones are opened, and the rest keep
+    going with their current stream/video flags.
+
+    A gap of up to ACTIVITY_RECONCILE_CREDIT_SECONDS since a session was last
+    settled (a missed tick or a quick reconnect) is credited; anything longer
+    is not, since we can't tell what happened in between.
+    """
+    now = time_module.time()
+    for guild in bot.guilds:
+        voice_index.seed(guild)
+
+    live = {}
+    for members in voice_index.guilds.values():
+        for member_id, entry in members.items():
+            if not entry.bot:
+                live[str(member_id)] = entry
+
+    in_vc = activity_data.columns["currently_in_vc"]
+    persisted = {str(activity_data.ids[row]) for row, flag in enumerate(in_vc) if flag}
+
+    gap = 0
+    kept = opened = closed = 0
+    for user_id in persisted | live.keys():
+        user_data = get_user_data(user_id)
+        last = user_data["last_activity_update"]
+        if user_id in persisted and last is not None:
+            gap = max(gap, now - last)
+            if now - last > ACTIVITY_RECONCILE_CREDIT_SECONDS:
+                user_data["last_activity_update"] = now
+
+        if user_id not in live:
+            close_voice_session(user_id, now)
+            closed += 1
+            continue
+
+        if user_id in persisted:
+            kept += 1
+        else:
+            opened += 1
+        open_voice_session(user_id, live[user_id], now)
+
+    print(
+        f"[ACTIVITY] Reconciled sessions after {reason}: {kept} kept, {opened} opened, "
+        f"{closed} closed, longest gap {format_time(int(gap))}"
+    )
+
 @tasks.loop(minutes=1)
 async def update_activity_tracking():
-    """Update activity and award coins every minute"""
+    """Settle open voice sessions and award coins every minute"""
     current_time = time_module.time()
-    
-    for guild in bot.guilds:
-        for member in guild.members:
-            if member.bot:
-                continue
-            
-            user_id = str(member.id)
-            user_data = get_user_data(user_id)
-            
-            # Check if user is in VC
-            if member.voice and member.voice.channel:
-                # User is in VC
-                if not user_data["currently_in_vc"]:
-                    # Just joined
-                    user_data["currently_in_vc"] = True
-                    user_data["vc_join_time"] = current_time
-                
-                # Add 60 seconds of voice time
-                user_data["voice_time"] += 60
-                user_data["xp"] += 1  # 1 XP per minute in VC
-                
-                # Check for streaming
-                if member.voice.self_stream:
-                    if user_data["stream_start_time"] is None:
-                        user_data["stream_start_time"] = current_time
-                    user_data["stream_time"] += 60
-                    user_data["xp"] += 2  # Bonus XP for streaming
-                else:
-                    user_data["stream_start_time"] = None
-                
-                # Check for video
-                if member.voice.self_video:
-                    if user_data["video_start_time"] is None:
-                        user_data["video_start_time"] = current_time
-                    user_data["video_time"] += 60
-                    user_data["xp"] += 1  # Bonus XP for video
-                else:
-                    user_data["video_start_time"] = None
-                
-                # Update level
-                new_level = calculate_level(user_data["xp"])
-                if new_level > user_data["level"]:
-                    user_data["level"] = new_level
-                
-                # Award coins based on level
-                coin_rate = calculate_coin_rate(user_data["level"])
-                user_data["coins"] += coin_rate
-                
-            else:
-                # User left VC
-                if user_data["currently_in_vc"]:
-                    user_data["currently_in_vc"] = False
-                    user_data["vc_join_time"] = None
-                    user_data["stream_start_time"] = None
-                    user_data["video_start_time"] = None
-            
-            user_data["last_activity_update"] = current_time
-    
+
+    rows = [activity_data.ensure(str(member_id)) for member_id in voice_index.human_member_ids()]
+    activity_data.settle(rows, current_time)
+
     save_activity_data(activity_data)
+    maybe_compact_activity_data(activity_data)
+
+# =====================================================
+#                  MEMBER NAME LOOKUP
+# =====================================================
+
+MEMBER_NAME_CACHE_SIZE = 5000
+QUERY_MEMBERS_BATCH = 100   # Discord caps user_ids per member query at 100
+
+class MemberNameCache:
+    """LRU of (guild_id, user_id) -> display name, or None for bots and users who left."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        if key not in self.entries:
+            return _MISSING
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, name):
+        self.entries[key] = name
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+member_names = MemberNameCache(MEMBER_NAME_CACHE_SIZE)
+
+def _member_name(member):
+    return None if member is None or member.bot else member.display_name
+
+async def resolve_member_names(guild: discord.Guild, user_ids):
+    """
+    Display names for the humans among `user_ids` that are still in `guild`.
+
+    Reads the member cache first, then the name LRU, and resolves whatever is
+    left with one gateway query per 100 ids instead of a REST call per user.
+    """
+    names = {}
+    misses = []
+    for user_id in user_ids:
+        member = guild.get_member(user_id)
+        if member is not None:
+            name = _member_name(member)
+            member_names.put((guild.id, user_id), name)
+        else:
+            name = member_names.get((guild.id, user_id))
+            if name is _MISSING:
+                misses.append(user_id)
+                continue
+        if name is not None:
+            names[user_id] = name
+
+    for i in range(0, len(misses), QUERY_MEMBERS_BATCH):
+        batch = misses[i:i + QUERY_MEMBERS_BATCH]
+        try:
+            found = await guild.query_members(user_ids=batch, limit=len(batch), cache=True)
+        except (asyncio.TimeoutError, discord.ClientException) as e:
+            print(f"[MEMBERS] query_members failed for {len(batch)} ids: {e}")
+            continue
+
+        found = {member.id: member for member in found}
+        for user_id in batch:
+            name = _member_name(found.get(user_id))
+            member_names.put((guild.id, user_id), name)
+            if name is not None:
+                names[user_id] = name
+
+    return names
 
 # =====================================================
 #                  LEADERBOARD VIEW
 # =====================================================
 
+LEADERBOARD_PAGE_SIZE = 10
+LEADERBOARD_PAGE_CACHE = 4   # rendered page embeds kept per view
+
 class LeaderboardView(View):
-    def __init__(self, guild: discord.Guild, pages: list, current_page: int = 0):
+    """
+    Pages through one metric's ranking, rendering each page only when it is
+    first shown. The ranked ids are copied when the view is created, so pages
+    stay consistent while activity keeps settling. Bots and users who left are
+    skipped as pages are filled, so each page remembers where it started.
+    """
+
+    def __init__(self, guild: discord.Guild, sort_key: str, sort_name: str, period: str = None):
         super().__init__(timeout=180)
         self.guild = guild
-        self.pages = pages
-        self.current_page = current_page
-        self.update_buttons()
+        self.sort_key = period_field(sort_key, period)
+        self.sort_name = sort_name
+        self.period = period
+        self.ranking = [int(user_id) for user_id in activity_data.ranked(self.sort_key)]
+        self.page_starts = [0]   # position in self.ranking where each page begins
+        self.rendered = OrderedDict()
+        self.current_page = 0
+        self.has_next = False
+
+    async def render(self, page: int):
+        """The embed for `page` (or None if it has no users)."""
+        if page in self.rendered:
+            self.rendered.move_to_end(page)
+            self.has_next = self.page_starts[page + 1] < len(self.ranking)
+            return self.rendered[page]
+
+        # walk the ranking from this page's start until the page is full; names are
+        # resolved a whole member-query batch ahead so later pages hit the name cache
+        cursor = self.page_starts[page]
+        page_users = []
+        while len(page_users) < LEADERBOARD_PAGE_SIZE and cursor < len(self.ranking):
+            chunk = self.ranking[cursor:cursor + QUERY_MEMBERS_BATCH]
+            names = await resolve_member_names(self.guild, chunk)
+            for user_id in chunk:
+                cursor += 1
+                if user_id in names:
+                    page_users.append((user_id, names[user_id]))
+                    if len(page_users) == LEADERBOARD_PAGE_SIZE:
+                        break
+
+        if len(self.page_starts) == page + 1:
+            self.page_starts.append(cursor)
+        self.has_next = cursor < len(self.ranking)
+
+        if not page_users:
+            return None
+
+        description = f"Sorted by: **{self.sort_name}**"
+        if self.period:
+            description += f" • {ACTIVITY_PERIOD_NAMES[self.period]}"
+
+        embed = discord.Embed(
+            title="🏆 Activity Leaderboard",
+            description=description,
+            color=0xFFD700
+        )
+
+        leaderboard_text = ""
+        for idx, (user_id, name) in enumerate(page_users, start=page * LEADERBOARD_PAGE_SIZE + 1):
+            data = activity_data[str(user_id)]
+            stat = lambda field: data[period_field(field, self.period)]
+
+            # Red dot if currently in VC
+            status = "🔴" if voice_index.get(self.guild.id, user_id) else "⚫"
+
+            # Rank emoji
+            if idx == 1:
+                rank_emoji = "🥇"
+            elif idx == 2:
+                rank_emoji = "🥈"
+            elif idx == 3:
+                rank_emoji = "🥉"
+            else:
+                rank_emoji = f"**#{idx}**"
+
+            leaderboard_text += (
+                f"{rank_emoji} {status} **{name}**\n"
+                f"├ Level {data['level']} • {stat('xp')} XP\n"
+                f"├ 💰 {stat('coins'):.1f} coins\n"
+                f"├ 🎤 {format_time(stat('voice_time'))}\n"
+                f"├ 📺 {format_time(stat('stream_time'))}\n"
+                f"└ 📹 {format_time(stat('video_time'))}\n\n"
+            )
+
+        embed.description += f"\n\n{leaderboard_text}"
+        embed.set_footer(text=f"Page {page + 1} • 🔴 = Currently in VC")
+        embed.timestamp = datetime.utcnow()
+
+        self.rendered[page] = embed
+        if len(self.rendered) > LEADERBOARD_PAGE_CACHE:
+            self.rendered.popitem(last=False)
+        return embed
     
     def update_buttons(self):
         self.clear_items()
@@ -1990,7 +3852,7 @@ class LeaderboardView(View):
         
         # Page indicator
         page_button = Button(
-            label=f"Page {self.current_page + 1}/{len(self.pages)}",
+            label=f"Page {self.current_page + 1}",
             style=discord.ButtonStyle.blurple,
             disabled=True
         )
@@ -2000,120 +3862,89 @@ class LeaderboardView(View):
         next_button = Button(
             label="Next ▶",
             style=discord.ButtonStyle.gray,
-            disabled=self.current_page >= len(self.pages) - 1
+            disabled=not self.has_next
         )
         next_button.callback = self.next_page
         self.add_item(next_button)
+
+    async def show(self, interaction: discord.Interaction, page: int):
+        # rendering may wait on member queries; acknowledge within the 3s window first
+        await interaction.response.defer()
+        embed = await self.render(page)
+        if embed is None:
+            # the remaining ids were all bots or users who left
+            self.has_next = False
+            self.update_buttons()
+            return await interaction.edit_original_response(view=self)
+
+        self.current_page = page
+        self.update_buttons()
+        await interaction.edit_original_response(embed=embed, view=self)
     
     async def previous_page(self, interaction: discord.Interaction):
         if self.current_page > 0:
-            self.current_page -= 1
-            self.update_buttons()
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
+            await self.show(interaction, self.current_page - 1)
     
     async def next_page(self, interaction: discord.Interaction):
-        if self.current_page < len(self.pages) - 1:
-            self.current_page += 1
-            self.update_buttons()
-            await interaction.response.edit_message(embed=self.pages[self.current_page], view=self)
+        if self.has_next:
+            await self.show(interaction, self.current_page + 1)
 
 # =====================================================
 #              LEADERBOARD COMMAND
 # =====================================================
 
 @tree.command(name="leaderboard", description="View activity leaderboard")
-@app_commands.describe(sort_by="What to sort by")
+@app_commands.describe(sort_by="What to sort by", period="Time window (leave empty for all time)")
 @app_commands.choices(sort_by=[
     app_commands.Choice(name="XP", value="xp"),
     app_commands.Choice(name="Voice Time", value="voice_time"),
     app_commands.Choice(name="Stream Time", value="stream_time"),
     app_commands.Choice(name="Video Time", value="video_time"),
     app_commands.Choice(name="Coins", value="coins"),
+], period=[
+    app_commands.Choice(name="Today", value="day"),
+    app_commands.Choice(name="This Week", value="week"),
+    app_commands.Choice(name="This Month", value="month"),
 ])
 async def leaderboard(
     interaction: discord.Interaction,
-    sort_by: app_commands.Choice[str] = None
+    sort_by: app_commands.Choice[str] = None,
+    period: app_commands.Choice[str] = None
 ):
     await interaction.response.defer()
     
     sort_key = sort_by.value if sort_by else "xp"
+    activity_data.roll_periods(time_module.time())
     
-    # Get all users with data
-    user_list = []
-    for user_id, data in activity_data.items():
-        try:
-            member = await interaction.guild.fetch_member(int(user_id))
-            if member and not member.bot:
-                user_list.append({
-                    "member": member,
-                    "data": data,
-                    "user_id": user_id
-                })
-        except:
-            continue
-    
-    # Sort by selected metric
-    user_list.sort(key=lambda x: x["data"][sort_key], reverse=True)
-    
-    # Create pages (10 users per page)
-    users_per_page = 10
-    pages = []
-    
-    for page_num in range(0, len(user_list), users_per_page):
-        page_users = user_list[page_num:page_num + users_per_page]
-        
-        embed = discord.Embed(
-            title="🏆 Activity Leaderboard",
-            description=f"Sorted by: **{sort_by.name if sort_by else 'XP'}**",
-            color=0xFFD700
-        )
-        
-        leaderboard_text = ""
-        for idx, user_info in enumerate(page_users, start=page_num + 1):
-            member = user_info["member"]
-            data = user_info["data"]
-            
-            # Red dot if currently in VC
-            status = "🔴" if data["currently_in_vc"] else "⚫"
-            
-            # Rank emoji
-            if idx == 1:
-                rank_emoji = "🥇"
-            elif idx == 2:
-                rank_emoji = "🥈"
-            elif idx == 3:
-                rank_emoji = "🥉"
-            else:
-                rank_emoji = f"**#{idx}**"
-            
-            leaderboard_text += (
-                f"{rank_emoji} {status} **{member.display_name}**\n"
-                f"├ Level {data['level']} • {data['xp']} XP\n"
-                f"├ 💰 {data['coins']:.1f} coins\n"
-                f"├ 🎤 {format_time(data['voice_time'])}\n"
-                f"├ 📺 {format_time(data['stream_time'])}\n"
-                f"└ 📹 {format_time(data['video_time'])}\n\n"
-            )
-        
-        embed.description += f"\n\n{leaderboard_text}"
-        embed.set_footer(text=f"Page {len(pages) + 1} • 🔴 = Currently in VC")
-        embed.timestamp = datetime.utcnow()
-        
-        pages.append(embed)
+    # Pages are read from the rank index and rendered as they are opened
+    view = LeaderboardView(
+        interaction.guild, sort_key, sort_by.name if sort_by else "XP",
+        period.value if period else None
+    )
     
-    if not pages:
+    first_page = await view.render(0)
+    if first_page is None:
         return await interaction.followup.send("No activity data yet!")
     
-    view = LeaderboardView(interaction.guild, pages)
-    await interaction.followup.send(embed=pages[0], view=view)
+    view.update_buttons()
+    await interaction.followup.send(embed=first_page, view=view)
 
 # =====================================================
 #              PROFILE COMMAND
 # =====================================================
 
 @tree.command(name="profile", description="View your profile or someone else's")
-@app_commands.describe(user="The user to view (leave empty for yourself)")
-async def profile(interaction: discord.Interaction, user: discord.Member = None):
+@app_commands.describe(user="The user to view (leave empty for yourself)", period="Time window for rank and activity (leave empty for all time)")
+@app_commands.choices(period=[
+    app_commands.Choice(name="Today", value="day"),
+    app_commands.Choice(name="This Week", value="week"),
+    app_commands.Choice(name="This Month", value="month"),
+])
+async def profile(
+    interaction: discord.Interaction,
+    user: discord.Member = None,
+    period: app_commands.Choice[str] = None
+):
     target = user or interaction.user
     
     if target.bot:
@@ -2122,15 +3953,13 @@ async def profile(interaction: discord.Interaction, user: discord.Member = None)
     user_id = str(target.id)
     user_data = get_user_data(user_id)
     
-    # Calculate rank
-    all_users = [(uid, data) for uid, data in activity_data.items()]
-    all_users.sort(key=lambda x: x[1]["xp"], reverse=True)
+    window = period.value if period else None
+    activity_data.roll_periods(time_module.time())
     
-    rank = "Unranked"
-    for idx, (uid, _) in enumerate(all_users, start=1):
-        if uid == user_id:
-            rank = f"#{idx}"
-            break
+    # Calculate rank
+    rank = f"#{activity_data.rank(period_field('xp', window), user_id)}"
+    if period:
+        rank += f" ({period.name})"
     
     # Create embed
     embed = discord.Embed(
@@ -2196,14 +4025,15 @@ async def profile(interaction: discord.Interaction, user: discord.Member = None)
     )
     
     # Activity stats
-    status = "🔴 In VC" if user_data["currently_in_vc"] else "⚫ Offline"
+    status = "🔴 In VC" if voice_index.get(target.guild.id, target.id) else "⚫ Offline"
     embed.add_field(
-        name="📊 Activity",
+        name=f"📊 Activity ({period.name})" if period else "📊 Activity",
         value=(
             f"**Status:** {status}\n"
-            f"**Voice:** {format_time(user_data['voice_time'])}\n"
-            f"**Stream:** {format_time(user_data['stream_time'])}\n"
-            f"**Video:** {format_time(user_data['video_time'])}"
+            f"**Voice:** {format_time(user_data[period_field('voice_time', window)])}\n"
+            f"**Stream:** {format_time(user_data[period_field('stream_time', window)])}\n"
+            f"**Video:** {format_time(user_data[period_field('video_time', window)])}"
+            + (f"\n**XP:** {user_data[period_field('xp', window)]}" if window else "")
         ),
         inline=True
     )
@@ -2217,6 +4047,14 @@ async def profile(interaction: discord.Interaction, user: discord.Member = None)
 #              SHOP COMMANDS
 # =====================================================
 
+def load_shop_data():
+    return state.load("shop", {"items": []})
+
+def save_shop_data(data):
+    state.save("shop", data)
+
+shop_data = load_shop_data()
+
 @tree.command(name="shop", description="View the shop")
 async def shop(interaction: discord.Interaction):
     items = shop_data["items"]
@@ -2350,7 +4188,7 @@ def make_todo_embed(user: discord.User | discord.Member, user_todo: dict) -> dis
     return embed
 
 
-async def _post_new_embed(channel, user_todo: dict, author):
+async def _post_new_embed(channel, key: str, user_todo: dict, author):
     """Always post a fresh embed, deleting the previous one if it exists."""
     embed = make_todo_embed(author, user_todo)
 
@@ -2365,7 +4203,7 @@ async def _post_new_embed(channel, user_todo: dict, author):
 
     sent = await channel.send(embed=embed)
     user_todo["embed_message_id"] = sent.id
-    await save_todo_data()
+    await save_todo_data(key)
 
 
 @bot.event
@@ -2374,6 +4212,10 @@ async def on_message(message: discord.Message):
     if message.author.bot:
         return
 
+    # Remember the latest post in journal threads for the reminder check
+    if message.channel.id in journal_posts.watched:
+        journal_posts.record(message.channel.id, message.author.id, message.created_at.timestamp())
+
     content = message.content.strip()
     lines   = content.splitlines()
 
@@ -2394,6 +4236,15 @@ async def on_message(message: discord.Message):
         await bot.process_commands(message)
         return
 
+    # Keep the message so it can be re-sent if the channel's lists are not loaded yet
+    if not await ensure_todo_channel(message.channel.id):
+        await message.channel.send(
+            "⚠️ Couldn't load this channel's to-do lists right now, please try again in a moment.",
+            delete_after=10
+        )
+        await bot.process_commands(message)
+        return
+
     # Delete the user's input message for a cleaner look
     try:
         await message.delete()
@@ -2437,7 +4288,7 @@ async def on_message(message: discord.Message):
             if not any(c["id"] == task["id"] for c in user_todo["completed"]):
                 user_todo["completed"].append(task)
 
-    await _post_new_embed(message.channel, user_todo, message.author)
+    await _post_new_embed(message.channel, key, user_todo, message.author)
     await bot.process_commands(message)
 
 
@@ -2450,6 +4301,11 @@ async def on_message(message: discord.Message):
 async def cleartodo(interaction: discord.Interaction, what: app_commands.Choice[str] = None):
     key   = f"{interaction.channel.id}:{interaction.user.id}"
     clear = what.value if what else "all"
+    if not await ensure_todo_channel(interaction.channel.id):
+        return await interaction.response.send_message(
+            "⚠️ Couldn't load this channel's to-do lists right now, please try again in a moment.",
+            ephemeral=True
+        )
 
     if key not in todo_data:
         return await interaction.response.send_message("You have no to-do list here!", ephemeral=True)
@@ -2462,7 +4318,7 @@ async def cleartodo(interaction: discord.Interaction, what: app_commands.Choice[
     elif clear == "completed":
         user_todo["completed"] = []
 
-    await _post_new_embed(interaction.channel, user_todo, interaction.user)
+    await _post_new_embed(interaction.channel, key, user_todo, interaction.user)
     await interaction.response.send_message("✅ To-do list cleared!", ephemeral=True)
 
 
@@ -2472,7 +4328,12 @@ async def cleartodo(interaction: discord.Interaction, what: app_commands.Choice[
 
 async def main():
     asyncio.create_task(start_webserver())
-    await bot.start(TOKEN)
+    try:
+        await bot.start(TOKEN)
+    finally:
+        save_activity_data(activity_data)
+        await replicator.close()
+        await gh_store.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,349 @@
+"""
+Voice-event replay load generator for the enforcement and activity paths.
+
+Feeds synthetic (or recorded) voice state transitions for a fake guild
+through the bot's real on_voice_state_update and update_activity_tracking,
+on a virtual clock, and reports handler latency percentiles, task counts,
+memory growth and event-loop lag. Removals issued by enforcement come back
+as "left voice" events, like they would from the gateway.
+
+    python voice_replay_bench.py --members 5000 --rate 50 --duration 1800
+    python voice_replay_bench.py --record events.jsonl      # save the generated events
+    python voice_replay_bench.py --replay events.jsonl      # replay recorded events
+
+Recorded events are JSON lines: {"t": seconds, "member": id, "channel": id or null,
+"stream": bool, "video": bool}.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+import tracemalloc
+
+from persistence_bench import percentile
+
+GUILD_ID = 1
+FIRST_CHANNEL_ID = 1000
+FIRST_MEMBER_ID = 100000
+SETTLE_ROUNDS = 5   # event-loop passes given to the scheduler and action queue after each clock move
+
+
+class VirtualClock:
+    """
+    Stands in for the time module inside vc_bot: time() and monotonic() are
+    virtual (deadlines and the action queue's token buckets both follow the
+    replay), everything else is real.
+    """
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+
+def current_rss():
+    """Resident set size in bytes, from /proc (Linux), or None elsewhere."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return None
+
+
+class FakeVoiceState:
+    __slots__ = ("channel", "self_stream", "self_video")
+
+    def __init__(self, channel=None, self_stream=False, self_video=False):
+        self.channel = channel
+        self.self_stream = self_stream
+        self.self_video = self_video
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+        self.name = f"vc-{channel_id}"
+        self.mention = f"<#{channel_id}>"
+        self.members = set()
+
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+        self.name = "Replay"
+        self.members = {}
+        self.channels = {}
+        self.stage_channels = []
+
+    @property
+    def voice_channels(self):
+        return list(self.channels.values())
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+
+class FakeMember:
+    def __init__(self, replay, guild, member_id):
+        self.replay = replay
+        self.guild = guild
+        self.id = member_id
+        self.bot = False
+        self.roles = []
+        self.name = self.display_name = f"member{member_id}"
+        self.mention = f"<@{member_id}>"
+        self.voice = FakeVoiceState()
+
+    def __str__(self):
+        return self.name
+
+    async def send(self, embed=None):
+        self.replay.dms += 1
+
+    async def move_to(self, channel, reason=None):
+        self.replay.removals += 1
+        # the gateway would answer with a voice state update
+        self.replay.injected.append((self.id, None, False, False))
+
+
+class Replay:
+    def __init__(self, vc_bot, args):
+        self.vc_bot = vc_bot
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.clock = VirtualClock(time.time())
+        self.guild = FakeGuild(GUILD_ID)
+        self.injected = []
+        self.dms = 0
+        self.removals = 0
+
+        for i in range(args.channels):
+            channel = FakeChannel(FIRST_CHANNEL_ID + i, self.guild)
+            self.guild.channels[channel.id] = channel
+        for i in range(args.members):
+            member = FakeMember(self, self.guild, FIRST_MEMBER_ID + i)
+            self.guild.members[member.id] = member
+
+        self.channel_ids = list(self.guild.channels)
+        self.monitored = frozenset(self.channel_ids[:args.monitored])
+        self.member_ids = list(self.guild.members)
+
+        self.handler_latencies = []
+        self.tick_latencies = []
+        self.loop_lag = []
+        self.max_tasks = 0
+        self.max_queued = 0
+
+    # ---------- workload ----------
+    def synthetic_events(self):
+        """Random joins, leaves, channel switches and stream/camera toggles."""
+        in_voice = {}  # member id -> (channel, stream, video)
+        t = 0.0
+        for _ in range(int(self.args.rate * self.args.duration)):
+            t += self.random.expovariate(self.args.rate)
+            member_id = self.random.choice(self.member_ids)
+            state = in_voice.get(member_id)
+            roll = self.random.random()
+
+            if state is None:
+                active = self.random.random() < self.args.active_ratio
+                state = (self.random.choice(self.channel_ids), active and roll < 0.5, active and roll >= 0.5)
+            elif roll < 0.10:
+                state = None
+            elif roll < 0.45:
+                state = (state[0], not state[1], state[2])
+            elif roll < 0.80:
+                state = (state[0], state[1], not state[2])
+            else:
+                state = (self.random.choice(self.channel_ids), state[1], state[2])
+
+            if state is None:
+                in_voice.pop(member_id, None)
+                yield {"t": t, "member": member_id, "channel": None, "stream": False, "video": False}
+            else:
+                in_voice[member_id] = state
+                yield {"t": t, "member": member_id, "channel": state[0], "stream": state[1], "video": state[2]}
+
+    def recorded_events(self, path):
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    # ---------- driving the handlers ----------
+    async def apply(self, member_id, channel_id, stream, video):
+        member = self.guild.members[member_id]
+        before = member.voice
+        channel = self.guild.channels.get(channel_id) if channel_id is not None else None
+        after = FakeVoiceState(channel, stream and channel is not None, video and channel is not None)
+
+        if before.channel:
+            before.channel.members.discard(member)
+        if channel:
+            channel.members.add(member)
+        member.voice = after
+
+        started = time.perf_counter()
+        await self.vc_bot.on_voice_state_update(member, before, after)
+        self.handler_latencies.append(time.perf_counter() - started)
+
+    async def advance(self, virtual_time):
+        """Move the virtual clock, running any activity ticks that fall due on the way."""
+        while self.next_tick <= virtual_time:
+            self.clock.now = self.start + self.next_tick
+            started = time.perf_counter()
+            await self.vc_bot.update_activity_tracking.coro()
+            self.tick_latencies.append(time.perf_counter() - started)
+            self.next_tick += 60
+
+        self.clock.now = self.start + virtual_time
+        # deadlines and rate limits are measured on the virtual clock, so re-check them now
+        self.vc_bot.enforcement.wake()
+        if self.vc_bot.action_queue._wake is not None:
+            self.vc_bot.action_queue._wake.set()
+        for _ in range(SETTLE_ROUNDS):
+            await asyncio.sleep(0)
+
+        while self.injected:
+            await self.apply(*self.injected.pop(0))
+
+    async def monitor(self, interval=0.01):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            self.loop_lag.append(time.perf_counter() - started - interval)
+            self.max_tasks = max(self.max_tasks, len(asyncio.all_tasks()))
+            self.max_queued = max(self.max_queued, sum(self.vc_bot.action_queue.depth().values()))
+
+    async def run(self, events):
+        vc_bot = self.vc_bot
+        vc_bot.time_module = self.clock
+        vc_bot.bot.get_guild = lambda guild_id: self.guild if guild_id == self.guild.id else None
+        vc_bot.enforcement_config.update(self.guild.id, channels=self.monitored)
+        vc_bot.voice_index.seed(self.guild)
+
+        self.start = self.clock.now
+        self.next_tick = 60
+        monitor = asyncio.create_task(self.monitor())
+        record = open(self.args.record, "w") if self.args.record else None
+
+        rss_before = current_rss()
+        if self.args.trace_memory:
+            tracemalloc.start()
+
+        started = time.perf_counter()
+        count = 0
+        for event in events:
+            if record:
+                record.write(json.dumps(event) + "\n")
+            await self.advance(event["t"])
+            await self.apply(event["member"], event["channel"], event["stream"], event["video"])
+            count += 1
+
+            if self.args.speed:
+                # pace the replay: `speed` virtual seconds per real second
+                lead = event["t"] / self.args.speed - (time.perf_counter() - started)
+                if lead > 0:
+                    await asyncio.sleep(lead)
+        await self.advance(self.args.duration if not self.args.replay else self.clock.now - self.start)
+        elapsed = time.perf_counter() - started
+
+        if record:
+            record.close()
+        monitor.cancel()
+        return count, elapsed, rss_before
+
+    def report(self, count, elapsed, rss_before):
+        vc_bot = self.vc_bot
+        rss_after = current_rss()
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux
+
+        def line(name, values):
+            values = sorted(values)
+            print(
+                f"{name:<26} n={len(values):<8}"
+                f" p50 {percentile(values, 0.50) * 1000:>8.3f} ms"
+                f"   p99 {percentile(values, 0.99) * 1000:>8.3f} ms"
+                f"   max {(values[-1] if values else 0) * 1000:>8.3f} ms"
+            )
+
+        print(f"members={self.args.members} channels={self.args.channels} monitored={self.args.monitored} "
+              f"rate={self.args.rate}/s duration={self.args.duration}s\n")
+        print(f"events replayed            {count} in {elapsed:.2f}s real ({count / elapsed:.0f} events/s)\n")
+        line("on_voice_state_update", self.handler_latencies)
+        line("update_activity_tracking", self.tick_latencies)
+        line("event-loop lag", self.loop_lag)
+
+        print(f"\nmax asyncio tasks          {self.max_tasks}")
+        print(f"in voice at end            {sum(len(c.members) for c in self.guild.channels.values())}")
+        print(f"pending deadlines          {dict(vc_bot.enforcement.counts)}")
+        print(f"action queue               max {self.max_queued}, now {vc_bot.action_queue.depth()}")
+        print(f"actions sent / dropped     {dict(vc_bot.action_queue.sent)} / {dict(vc_bot.action_queue.dropped)}")
+        print(f"fake DMs / removals        {self.dms} / {self.removals}")
+        if rss_before is not None and rss_after is not None:
+            print(f"RSS growth                 {(rss_after - rss_before) / 2**20:+.1f} MB")
+        print(f"peak RSS                   {peak_rss / 1024:.1f} MB")
+        if self.args.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            print(f"traced memory              {current / 2**20:.1f} MB now, {peak / 2**20:.1f} MB peak")
+
+
+async def main(args):
+    # the bot reads its configuration at import time
+    workdir = tempfile.mkdtemp(prefix="vcbot-replay-")
+    os.environ.update({
+        "GH_API_URL": "http://127.0.0.1:9",
+        "GH_TOKEN": "replay",
+        "GH_REPO_OWNER": "replay",
+        "GH_REPO_NAME": "state",
+        "STATE_DB_PATH": os.path.join(workdir, "replay_state.db"),
+        "ACTIVITY_SNAPSHOT_PATH": os.path.join(workdir, "activity.snap"),
+        "ACTIVITY_JSON_EXPORT_PATH": os.path.join(workdir, "activity_export.json"),
+    })
+    import vc_bot
+
+    replay = Replay(vc_bot, args)
+    events = replay.recorded_events(args.replay) if args.replay else replay.synthetic_events()
+
+    # the handlers log every DM and removal; keep the report readable
+    with open(os.devnull, "w") as devnull:
+        with contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull):
+            result = await replay.run(events)
+    replay.report(*result)
+
+    await vc_bot.replicator.close()
+    await vc_bot.gh_store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=5000)
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--monitored", type=int, default=5, help="how many of the channels enforce cam/stream")
+    parser.add_argument("--rate", type=float, default=50.0, help="voice state events per virtual second")
+    parser.add_argument("--duration", type=float, default=1800.0, help="virtual seconds to generate")
+    parser.add_argument("--active-ratio", type=float, default=0.5, help="share of joins with cam or stream on")
+    parser.add_argument("--speed", type=float, default=0.0, help="virtual seconds per real second (0 = as fast as possible)")
+    parser.add_argument("--record", help="write the replayed events to this JSON-lines file")
+    parser.add_argument("--replay", help="replay events from this JSON-lines file instead of generating them")
+    parser.add_argument("--trace-memory", action="store_true", help="also report tracemalloc figures (slower)")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's own log output")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))